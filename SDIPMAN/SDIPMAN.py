@@ -16,8 +16,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import time
+
 from ryu import cfg
 from ryu.base import app_manager
+from ryu.app.wsgi import WSGIApplication
 from ryu.controller import ofp_event
 from ryu.controller.handler import MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
@@ -25,12 +28,20 @@ from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
 from ryu.lib.packet import arp
-from ryu.lib.packet import ipv4
-from ryu.lib.packet import tcp
-from ryu.lib.packet import udp
+from ryu.lib.packet import ether_types
 
 import network_awareness
 import network_monitor
+import flow_cookie
+from flow_installer import FlowInstaller
+from elephant_rerouter import ElephantRerouter
+from flow_rebalancer import FlowRebalancer
+from flow_registry import FlowRegistry, INSTALLED
+from packet_view import get_packet_view
+from path_hashing import get_path_bw, pick_path
+from prefix_routing import PrefixRoute, get_prefix
+from wcmp_routing import WcmpRoute
+import rest_api
 import setting
 
 
@@ -48,9 +59,10 @@ class ShortestForwarding(app_manager.RyuApp):
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 	_CONTEXTS = {
 		"network_awareness": network_awareness.NetworkAwareness,
-		"network_monitor": network_monitor.NetworkMonitor}
+		"network_monitor": network_monitor.NetworkMonitor,
+		"wsgi": WSGIApplication}
 
-	WEIGHT_MODEL = {'hop': 'weight', 'bw': 'bw'}
+	WEIGHT_MODEL = {'hop': 'weight', 'bw': 'bw', 'widest': 'widest'}
 
 	def __init__(self, *args, **kwargs):
 		super(ShortestForwarding, self).__init__(*args, **kwargs)
@@ -59,6 +71,21 @@ class ShortestForwarding(app_manager.RyuApp):
 		self.monitor = kwargs["network_monitor"]
 		self.datapaths = {}
 		self.weight = self.WEIGHT_MODEL[CONF.weight]
+		self.flow_installer = FlowInstaller(self.logger, timeout=setting.FLOW_SETUP_TIMEOUT)
+		self.prefix_routes = {}   # {(network, netmask):PrefixRoute,}
+		self.wcmp_routes = {}   # {dst_sw:WcmpRoute,}
+		self.flow_registry = FlowRegistry(setting.FLOW_IDLE_TIMEOUT,
+										  setup_timeout=setting.FLOW_SETUP_TIMEOUT)
+		self.arp_flood_time = {}   # {ip:time of last flood,}
+		self.path_ids = {}   # {(dpid,):path_id,}
+		self.snapshots = rest_api.SnapshotCache(setting.REST_SNAPSHOT_TTL)
+		self.rerouter = ElephantRerouter(setting.ELEPHANT_THRESHOLD,
+										 setting.REROUTE_MIN_GAIN,
+										 setting.REROUTE_HOLDDOWN)
+		self.rebalancer = FlowRebalancer(setting.REBALANCE_MAX_MOVES)
+		self.best_paths_updates = 0
+		kwargs["wsgi"].register(rest_api.SDIPMANRestController,
+								{rest_api.APP_INSTANCE_NAME: self})
 
 	@set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
 	def _state_change_handler(self, ev):
@@ -81,31 +108,69 @@ class ShortestForwarding(app_manager.RyuApp):
 			In packet_in handler, we need to learn access_table by ARP and IP packets.
 		'''
 		msg = ev.msg
-		pkt = packet.Packet(msg.data)
-		arp_pkt = pkt.get_protocol(arp.arp)
-		ip_pkt = pkt.get_protocol(ipv4.ipv4)
+		# The decoded view is shared with network_awareness.
+		view = get_packet_view(msg)
+		arp_pkt = view.arp
+		ip_pkt = view.ipv4
 
-		if isinstance(arp_pkt, arp.arp):
+		if arp_pkt:
 			self.logger.debug("ARP processing")
 			self.arp_forwarding(msg, arp_pkt.src_ip, arp_pkt.dst_ip)
 
-		if isinstance(ip_pkt, ipv4.ipv4):
+		if ip_pkt:
 			self.logger.debug("IPV4 processing")
-			if len(pkt.get_protocols(ethernet.ethernet)):
-				eth_type = pkt.get_protocols(ethernet.ethernet)[0].ethertype
-				self.shortest_forwarding(msg, eth_type, ip_pkt.src, ip_pkt.dst)
+			eth_type = view.ethertype
+			self.shortest_forwarding(msg, eth_type, ip_pkt.src, ip_pkt.dst)
 
-	def add_flow(self, dp, priority, match, actions, idle_timeout=0, hard_timeout=0):
+	@set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+	def _barrier_reply_handler(self, ev):
 		"""
-			Send a flow entry to datapath.
+			Confirm flow entries installed by self.flow_installer.
+		"""
+		self.flow_installer.barrier_reply(ev.msg)
+
+	@set_ev_cls(network_monitor.EventBestPathsUpdate)
+	def _best_paths_update_handler(self, ev):
+		"""
+			Re-point destination prefix entries to the new best paths,
+			reweight the select groups of 'wcmp' mode, or move flows to
+			other paths: every setting.REBALANCE_PERIODS
+			updates all flows are rebalanced, elephants are moved otherwise.
+		"""
+		self.best_paths_updates += 1
+		if setting.ROUTING_MODE == 'prefix':
+			self.repoint_prefix_routes(ev.best_paths)
+		elif setting.ROUTING_MODE == 'wcmp':
+			self.update_wcmp_routes()
+		elif setting.ENABLE_REBALANCE and self.best_paths_updates % setting.REBALANCE_PERIODS == 0:
+			self.rebalance_flows()
+		elif setting.ENABLE_REROUTE:
+			self.reroute_elephants()
+
+	def build_flow(self, dp, priority, match, actions, idle_timeout=0, hard_timeout=0, command=None, cookie=0):
+		"""
+			Build a flow entry for datapath.
 		"""
 		ofproto = dp.ofproto
 		parser = dp.ofproto_parser
+		if command is None:
+			command = ofproto.OFPFC_ADD
 		inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-		mod = parser.OFPFlowMod(datapath=dp, priority=priority,
+		mod = parser.OFPFlowMod(datapath=dp, cookie=cookie, table_id=flow_cookie.FLOW_TABLE_ID,
+								command=command, priority=priority,
 								idle_timeout=idle_timeout,
 								hard_timeout=hard_timeout,
-								match=match, instructions=inst)
+								match=match, instructions=inst,
+								out_port=ofproto.OFPP_ANY,
+								out_group=ofproto.OFPG_ANY)
+		return mod
+
+	def add_flow(self, dp, priority, match, actions, idle_timeout=0, hard_timeout=0):
+		"""
+			Send a flow entry to datapath.
+		"""
+		mod = self.build_flow(dp, priority, match, actions,
+							  idle_timeout=idle_timeout, hard_timeout=hard_timeout)
 		dp.send_msg(mod)
 
 	def _build_packet_out(self, datapath, buffer_id, src_port, dst_port, data):
@@ -135,17 +200,14 @@ class ShortestForwarding(app_manager.RyuApp):
 		if out:
 			datapath.send_msg(out)
 
-	def get_port(self, dst_ip, access_table):
+	def get_port(self, dst_ip):
 		"""
 			Get access port of dst host.
-			access_table = {(sw,port):(ip, mac),}
+			ip_to_location = {ip:(sw,port),}
 		"""
-		if access_table:
-			if isinstance(access_table.values()[0], tuple):
-				for key in access_table.keys():
-					if dst_ip == access_table[key][0]:   # Use the IP address only, not the MAC address. (hmc)
-						dst_port = key[1]
-						return dst_port
+		location = self.awareness.get_host_location(dst_ip)   # Use the IP address only, not the MAC address. (hmc)
+		if location:
+			return location[1]
 		return None
 
 	def get_port_pair_from_link(self, link_to_port, src_dpid, dst_dpid):
@@ -171,7 +233,7 @@ class ShortestForwarding(app_manager.RyuApp):
 
 		for dpid in self.awareness.access_ports:
 			for port in self.awareness.access_ports[dpid]:
-				if (dpid, port) not in self.awareness.access_table.keys():
+				if (dpid, port) not in self.awareness.access_table:
 					datapath = self.datapaths[dpid]
 					out = self._build_packet_out(
 						datapath, ofproto.OFP_NO_BUFFER,
@@ -191,6 +253,9 @@ class ShortestForwarding(app_manager.RyuApp):
 		result = self.awareness.get_host_location(dst_ip)
 		if result:
 			# Host has been recorded in access table.
+			if setting.ENABLE_ARP_PROXY and self.reply_arp(msg, result):
+				self.logger.debug("Reply ARP request on behalf of knew host")
+				return
 			datapath_dst, out_port = result[0], result[1]
 			datapath = self.datapaths[datapath_dst]
 			out = self._build_packet_out(datapath, ofproto.OFP_NO_BUFFER,
@@ -198,38 +263,106 @@ class ShortestForwarding(app_manager.RyuApp):
 										 out_port, msg.data)
 			datapath.send_msg(out)
 			self.logger.debug("Deliver ARP packet to knew host")
+		elif setting.ENABLE_ARP_PROXY:
+			# Flood only once in a while for the same unknown host.
+			now = time.time()
+			if now - self.arp_flood_time.get(dst_ip, 0) < setting.ARP_FLOOD_INTERVAL:
+				self.logger.debug("Drop duplicate ARP flood for %s" % dst_ip)
+				return
+			if len(self.arp_flood_time) > 4096:
+				self.arp_flood_time = dict((ip, t) for ip, t in self.arp_flood_time.items()
+										   if now - t < setting.ARP_FLOOD_INTERVAL)
+			self.arp_flood_time[dst_ip] = now
+			self.flood(msg)
 		else:
 			# Flood is not good.
 			self.flood(msg)
 
-	def get_path(self, src, dst, weight):
+	def reply_arp(self, msg, location):
+		"""
+			Answer an ARP request directly from the access table.
+			location = (dpid, port) of the requested host.
+			Return False if the packet is not an ARP request.
+		"""
+		arp_pkt = get_packet_view(msg).arp
+		if arp_pkt is None or arp_pkt.opcode != arp.ARP_REQUEST:
+			return False
+		host = self.awareness.get_host(location[0], location[1])
+		if host is None:
+			return False
+		dst_ip, dst_mac = host
+
+		reply = packet.Packet()
+		reply.add_protocol(ethernet.ethernet(
+			ethertype=ether_types.ETH_TYPE_ARP,
+			dst=arp_pkt.src_mac, src=dst_mac))
+		reply.add_protocol(arp.arp(
+			opcode=arp.ARP_REPLY,
+			src_mac=dst_mac, src_ip=dst_ip,
+			dst_mac=arp_pkt.src_mac, dst_ip=arp_pkt.src_ip))
+		reply.serialize()
+
+		datapath = msg.datapath
+		ofproto = datapath.ofproto
+		out = self._build_packet_out(datapath, ofproto.OFP_NO_BUFFER,
+									 ofproto.OFPP_CONTROLLER,
+									 msg.match['in_port'], reply.data)
+		datapath.send_msg(out)
+		return True
+
+	def get_path(self, src, dst, weight, flow_info=None):
 		"""
 			Get shortest path from network_awareness module.
 			generator (nx.shortest_simple_paths( )) produces
 			lists of simple paths, in order from shortest to longest.
+			With flow_info, the 'bw' weight pins the flow to one of the
+			k paths, see get_hashed_path().
 		"""
 		shortest_paths = self.awareness.shortest_paths
-		# Create bandwidth-sensitive datapath graph.
-		graph = self.awareness.graph
 
 		if weight == self.WEIGHT_MODEL['hop']:
 			return shortest_paths.get(src).get(dst)[0]
-		elif weight == self.WEIGHT_MODEL['bw']:
-			# Because all paths will be calculated when we call self.monitor.get_best_path_by_bw,
-			# so we just need to call it once in a period, and then, we can get path directly.
-			# If path is existed just return it, else calculate and return it.
-			try:
-				path = self.monitor.best_paths.get(src).get(dst)
-				return path
-			except:
-				result = self.monitor.get_best_path_by_bw(graph, shortest_paths)
-				# result = (capabilities, best_paths)
-				paths = result[1]
-				best_path = paths.get(src).get(dst)
-				return best_path
+		elif weight in (self.WEIGHT_MODEL['bw'], self.WEIGHT_MODEL['widest']):
+			if flow_info and weight == self.WEIGHT_MODEL['bw'] and setting.ENABLE_PATH_HASHING:
+				path = self.get_hashed_path(src, dst, flow_info)
+				if path:
+					return path
+			# Best paths of all pairs are recomputed by network_monitor in the
+			# background once a period, so we just read the latest table here.
+			# 'bw' picks the widest of the k shortest paths, 'widest' the
+			# widest of all paths.
+			best_paths = self.monitor.best_paths
+			if best_paths:
+				path = best_paths.get(src, {}).get(dst)
+				if path:
+					return path
+			# The table is not ready yet, use the shortest path by hop.
+			paths = shortest_paths.get(src, {}).get(dst)
+			if paths:
+				return paths[0]
+			return None
 		else:
 			pass
 
+	def get_hashed_path(self, src, dst, flow_info):
+		"""
+			Pick one of the k paths of (src, dst) for the flow by rendezvous
+			hashing weighted by the free bandwidth of the paths. Unlike the
+			single best path, which can change every monitor period, a flow
+			coming back after its entries have expired takes the same path
+			again unless the weights have shifted enough to move it, and
+			the flows between two switches are spread over the k paths.
+			Return None if the paths or the bandwidth are not known yet.
+		"""
+		paths = self.awareness.shortest_paths.get(src, {}).get(dst)
+		graph = self.monitor.graph
+		if not paths or graph is None:
+			return None
+		max_capacity = self.monitor.capacity.get_max()
+		weights = [get_path_bw(graph, path, max_capacity) for path in paths]
+		# The flow is the same whatever port it enters the first datapath by.
+		return pick_path(flow_info[1:3] + flow_info[4:], paths, weights)
+
 	def get_sw(self, dpid, in_port, src, dst):
 		"""
 			Get pair of source and destination switches.
@@ -250,9 +383,16 @@ class ShortestForwarding(app_manager.RyuApp):
 		else:
 			return None
 
-	def send_flow_mod(self, datapath, flow_info, src_port, dst_port):
+	def send_flow_mod(self, datapath, flow_info, src_port, dst_port, path_id=0):
 		"""
 			Build flow entry, and send it to datapath.
+		"""
+		datapath.send_msg(self.build_flow_mod(datapath, flow_info, src_port, dst_port, path_id))
+
+	def build_flow_mod(self, datapath, flow_info, src_port, dst_port, path_id=0, command=None):
+		"""
+			Build flow entry of flow_info for datapath.
+			The cookie of the entry carries its class and path_id.
 			flow_info = (eth_type, src_ip, dst_ip, in_port)
 			or
 			flow_info = (eth_type, src_ip, dst_ip, in_port, ip_proto, Flag, L4_port)
@@ -294,8 +434,10 @@ class ShortestForwarding(app_manager.RyuApp):
 		else:
 			pass
 
-		self.add_flow(datapath, 30, match, actions,
-					  idle_timeout=5, hard_timeout=0)
+		return self.build_flow(datapath, 30, match, actions,
+							   idle_timeout=setting.FLOW_IDLE_TIMEOUT, hard_timeout=0,
+							   command=command,
+							   cookie=flow_cookie.make_cookie(flow_cookie.COOKIE_FLOW, path_id))
 
 	def install_flow(self, datapaths, link_to_port, path, flow_info, buffer_id, data=None):
 		'''
@@ -304,6 +446,8 @@ class ShortestForwarding(app_manager.RyuApp):
 			flow_info = (eth_type, src_ip, dst_ip, in_port)
 			or
 			flow_info = (eth_type, src_ip, dst_ip, in_port, ip_proto, Flag, L4_port)
+			Entries are sent from the last hop back to the first one, so that
+			the packet can not overtake the downstream entries.
 		'''
 		if path is None or len(path) == 0:
 			self.logger.info("Path error!")
@@ -312,24 +456,501 @@ class ShortestForwarding(app_manager.RyuApp):
 		first_dp = datapaths[path[0]]
 		out_port = first_dp.ofproto.OFPP_LOCAL
 
-		# Install flow entry for intermediate datapaths.
-		for i in xrange(1, len(path) - 1):
+		#  Find the out port of the first datapath.
+		port_pair = self.get_port_pair_from_link(link_to_port, path[0], path[1])
+		if port_pair is None:
+			self.logger.info("Port not found in first hop.")
+			return
+		out_port = port_pair[0]
+
+		path_id = self.get_path_id(path)
+		batches = self._build_path_batches(datapaths, link_to_port, path, flow_info, path_id)
+		# Flow entry of the first datapath.
+		batches.append((first_dp, [self.build_flow_mod(first_dp, flow_info, in_port, out_port, path_id)]))
+		self.commit_flow_setup(batches, first_dp, buffer_id, in_port, out_port, data, flow_info, path)
+
+	def _get_hop_ports(self, link_to_port, path):
+		"""
+			Ports of the intermediate datapaths of path, in reverse path order.
+			hops = [(dpid, src_port, dst_port),]
+		"""
+		hops = []
+		for i in xrange(len(path) - 2, 0, -1):
 			port = self.get_port_pair_from_link(link_to_port, path[i-1], path[i])
 			port_next = self.get_port_pair_from_link(link_to_port, path[i], path[i+1])
 			if port and port_next:
-				src_port, dst_port = port[1], port_next[0]
-				datapath = datapaths[path[i]]
-				self.send_flow_mod(datapath, flow_info, src_port, dst_port)
+				hops.append((path[i], port[1], port_next[0]))
+		return hops
 
-		#  Install flow entry for the first datapath.
-		port_pair = self.get_port_pair_from_link(link_to_port, path[0], path[1])
+	def _build_path_batches(self, datapaths, link_to_port, path, flow_info, path_id):
+		"""
+			Flow entries of the intermediate datapaths of path, in reverse path order.
+			batches = [(datapath, [msg,]),]
+		"""
+		batches = []
+		for dpid, src_port, dst_port in self._get_hop_ports(link_to_port, path):
+			datapath = datapaths[dpid]
+			batches.append((datapath, [self.build_flow_mod(datapath, flow_info, src_port, dst_port, path_id)]))
+		return batches
+
+	def commit_flow_setup(self, batches, first_dp, buffer_id, in_port, out_port, data, flow_info, path):
+		"""
+			Send the flow entries of a new flow, and then the packet_out
+			to its first datapath. The flow is registered in the flow
+			registry, so that its duplicate packet_in are not set up again.
+			batches = [(datapath, [msg,]),], in the order they are to be sent.
+			The entries of first_dp go last: in barrier mode, they are sent
+			only once the downstream datapaths have confirmed theirs, so
+			that no packet of the flow is forwarded to a datapath which
+			has no entry for it yet.
+		"""
+		batches = self._coalesce(batches)
+		downstream = [(datapath, msgs) for datapath, msgs in batches if datapath.id != first_dp.id]
+		first_hop = [(datapath, msgs) for datapath, msgs in batches if datapath.id == first_dp.id]
+		record = self.flow_registry.add(self.get_flow_key(first_dp.id, flow_info),
+										path, in_port, out_port, self.get_path_id(path))
+		if setting.FLOW_INSTALL_MODE == 'barrier':
+			start = time.time()
+
+			# Send packet_out to the first datapath once all hops are confirmed.
+			def _release(latency, confirmed):
+				self.send_packet_out(first_dp, buffer_id, in_port, out_port, data)
+				for _buffer_id, _data in self.flow_registry.installed(record):
+					self.send_packet_out(first_dp, _buffer_id, in_port, out_port, _data)
+				self.logger.info("[FLOW SETUP]%s<-->%s: %.3f ms%s" % (
+					flow_info[1], flow_info[2], (time.time() - start) * 1000,
+					'' if confirmed else ' (barrier timeout)'))
+
+			def _install_first_hop(latency, confirmed):
+				self.flow_installer.install(
+					first_hop, lambda latency, first_confirmed: _release(latency, confirmed and first_confirmed))
+
+			self.flow_installer.install(downstream, _install_first_hop)
+		else:
+			for datapath, msgs in downstream + first_hop:
+				for msg in msgs:
+					datapath.send_msg(msg)
+			self.flow_registry.installed(record)
+			# Send packet_out to the first datapath.
+			self.send_packet_out(first_dp, buffer_id, in_port, out_port, data)
+
+	def reroute_elephants(self):
+		"""
+			Move elephant flows to the candidate paths with more free bandwidth.
+		"""
+		graph = self.monitor.graph
+		if graph is None:
+			return
+		now = time.time()
+		flows = self.get_active_flows()
+		self.rerouter.measure(flows, now)
+
+		link_bw = self.get_link_free_bw(graph)
+		moves = self.rerouter.plan(
+			flows, lambda src, dst: self.awareness.shortest_paths.get(src, {}).get(dst),
+			link_bw, self.monitor.capacity.get_max(), now)
+		for record, new_path, gain in moves:
+			self.reroute_flow(record, new_path)
+		if moves:
+			self.logger.info("[REROUTE] moved %d elephant flows, expected gain %.1f Kbit/s; "
+							 "total %d moved, expected gain %.1f Kbit/s, "
+							 "measured gain %.1f Kbit/s over %d flows" % (
+							 len(moves), sum(gain for record, new_path, gain in moves),
+							 self.rerouter.moves, self.rerouter.expected_gain,
+							 self.rerouter.measured_gain, self.rerouter.measured))
+
+	def rebalance_flows(self):
+		"""
+			Reassign the active flows to their candidate paths, minimizing
+			the maximum link utilization, and move only the flows whose
+			path has changed. The moves are applied only if they lower the
+			maximum utilization by setting.REBALANCE_MIN_IMPROVEMENT.
+		"""
+		graph = self.monitor.graph
+		if graph is None:
+			return
+		now = time.time()
+		flows = self.get_active_flows()
+		if not flows:
+			return
+		link_to_port = self.awareness.link_to_port
+		capacity = self.monitor.capacity
+
+		def _get_capacity(link):
+			port_pair = link_to_port.get(link)
+			if port_pair is None:
+				return capacity.get_max()
+			return capacity.get(link[0], port_pair[0])
+
+		link_load = dict((link, max(_get_capacity(link) - free_bw, 0))
+						 for link, free_bw in self.get_link_free_bw(graph).items())
+		records = dict((record.key, record) for record, rate in flows)
+		moves, before, after = self.rebalancer.rebalance(
+			[(record.key, record.path, rate) for record, rate in flows],
+			lambda src, dst: self.awareness.shortest_paths.get(src, {}).get(dst),
+			_get_capacity, link_load)
+		if not moves or before - after < setting.REBALANCE_MIN_IMPROVEMENT:
+			return
+
+		rates = dict((record.key, rate) for record, rate in flows)
+		for key, new_path in moves:
+			self.rerouter.hold(key, now, rates[key])
+			self.reroute_flow(records[key], new_path)
+		self.logger.info("[REBALANCE] moved %d of %d flows, max link utilization %.2f -> %.2f" % (
+			len(moves), len(flows), before, after))
+
+	def get_active_flows(self):
+		"""
+			Get the installed flows whose first-hop entry, with the same
+			match and path id, is in the last flow stats of the first
+			datapath, and follow the entries in the flow registry:
+			a record is refreshed only by the packets its own entry has
+			counted, and removed once its entry is missing from a reply
+			requested after the installation.
+			The rate of a flow is the speed of its entry on the first datapath.
+			flows = [(record, rate),], rate in Kbit/s.
+		"""
+		flows = []
+		for key, record in list(self.flow_registry.flows.items()):
+			if record.state != INSTALLED:
+				continue
+			dpid, flow_info = key[0], key[1:]
+			entries = self.monitor.flow_entries.get(dpid)
+			if entries is None:
+				continue
+			request_time, previous_time = self.monitor.flow_entries_time[dpid]
+			entry = entries.get(flow_info)
+			if entry is None or flow_cookie.get_path_id(entry[0]) != record.path_id:
+				if record.installed_at < request_time:
+					# The entry has idled out.
+					self.flow_registry.remove(key)
+				continue
+			cookie, packet_count, speed = entry
+			self.flow_registry.refresh(record, packet_count, previous_time)
+			flows.append((record, abs(speed) * 8 / 1000.0))
+		return flows
+
+	def get_link_free_bw(self, graph):
+		"""
+			link_bw = {(src_dpid, dst_dpid):free bandwidth,}, unit: Kbit/s.
+		"""
+		return dict(((src, dst), attr['bandwidth']) for src, dst, attr in graph.edges(data=True)
+					if 'bandwidth' in attr)
+
+	def reroute_flow(self, record, new_path):
+		"""
+			Move an installed flow to new_path, make-before-break.
+			A datapath of new_path whose entry for the flow (same in port)
+			already exists on the old path carries the flow now: it is
+			left alone if its out port does not change, else it is a
+			switch-over point. The entries of the other datapaths are added
+			first; only once they are confirmed by barriers, the switch-over
+			points are modified in place with MODIFY_STRICT, one at a time
+			from the last one back to the first datapath, each after the
+			barrier of the previous one. Every modification leads the flow
+			onto entries which are already confirmed, so packets never
+			miss an entry and none reach the controller.
+			The entries of the old path which are not used any more idle out.
+		"""
+		datapaths = self.datapaths
+		link_to_port = self.awareness.link_to_port
+		first_dp = datapaths.get(new_path[0])
+		port_pair = self.get_port_pair_from_link(link_to_port, new_path[0], new_path[1])
+		if first_dp is None or port_pair is None:
+			return
+		out_port = port_pair[0]
+		flow_info = record.key[1:]
+		path_id = self.get_path_id(new_path)
+		old_path = record.path
+		old_ports = dict(((dpid, src_port), dst_port) for dpid, src_port, dst_port
+						 in self._get_hop_ports(link_to_port, old_path))
+		batches = []
+		switch_over = []   # [(datapath, msg),], from the last one back to the first datapath.
+		for dpid, src_port, dst_port in self._get_hop_ports(link_to_port, new_path):
+			old_port = old_ports.get((dpid, src_port))
+			if old_port == dst_port:
+				continue
+			datapath = datapaths[dpid]
+			if old_port is None:
+				batches.append((datapath, [self.build_flow_mod(
+					datapath, flow_info, src_port, dst_port, path_id)]))
+			else:
+				switch_over.append((datapath, self.build_flow_mod(
+					datapath, flow_info, src_port, dst_port, path_id,
+					command=datapath.ofproto.OFPFC_MODIFY_STRICT)))
+		switch_over.append((first_dp, self.build_flow_mod(
+			first_dp, flow_info, record.in_port, out_port, path_id,
+			command=first_dp.ofproto.OFPFC_MODIFY_STRICT)))
+
+		def _switch(mods, confirmed=True):
+			if not mods:
+				record.path = new_path
+				record.out_port = out_port
+				self.logger.info("[REROUTE]%s<-->%s: %s -> %s%s" % (
+					flow_info[1], flow_info[2], old_path, new_path,
+					'' if confirmed else ' (barrier timeout)'))
+				return
+			datapath, mod = mods[0]
+			self.flow_installer.install(
+				[(datapath, [mod])],
+				lambda latency, _confirmed: _switch(mods[1:], confirmed and _confirmed))
+
+		def _made(latency, confirmed):
+			if not confirmed:
+				self.logger.info("[REROUTE]%s<-->%s: new path not confirmed, stay on %s" % (
+					flow_info[1], flow_info[2], old_path))
+				return
+			_switch(switch_over)
+
+		self.flow_installer.install(self._coalesce(batches), _made)
+
+	def get_flow_key(self, dpid, flow_info):
+		"""
+			Key of a flow in the flow registry, i.e. its first-hop match.
+		"""
+		return (dpid,) + tuple(flow_info)
+
+	def forward_duplicate(self, record, msg):
+		"""
+			Forward a packet_in of a flow which is already being installed
+			or installed. No flow entry is sent, only a packet_out, which
+			waits for the barrier replies if the setup is still pending.
+		"""
+		if self.flow_registry.hold(record, msg.buffer_id, msg.data):
+			return
+		datapath = msg.datapath
+		self.send_packet_out(datapath, msg.buffer_id, record.in_port, record.out_port, msg.data)
+
+	def get_path_id(self, path):
+		"""
+			Get the id of path, which is encoded into the cookies of the
+			flow entries installed along it.
+		"""
+		key = tuple(path)
+		path_id = self.path_ids.get(key)
+		if path_id is None:
+			path_id = self.path_ids[key] = len(self.path_ids) + 1
+		return path_id
+
+	def _coalesce(self, batches):
+		'''
+			Merge the messages of the same datapath into one batch,
+			keeping the order in which datapaths first appear.
+			batches = [(datapath, [msg,]),]
+		'''
+		merged = []
+		index = {}
+		for datapath, msgs in batches:
+			if datapath.id in index:
+				merged[index[datapath.id]][1].extend(msgs)
+			else:
+				index[datapath.id] = len(merged)
+				merged.append((datapath, list(msgs)))
+		return merged
+
+	def build_prefix_flow_mod(self, datapath, prefix, dst_port, command=None):
+		"""
+			Build destination prefix entry for datapath.
+			prefix = (network, netmask)
+		"""
+		parser = datapath.ofproto_parser
+		match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ipv4_dst=prefix)
+		actions = []
+		if dst_port is not None:
+			actions.append(parser.OFPActionOutput(dst_port))
+		return self.build_flow(datapath, setting.PREFIX_PRIORITY, match, actions,
+							   idle_timeout=0, hard_timeout=0, command=command,
+							   cookie=flow_cookie.make_cookie(flow_cookie.COOKIE_PREFIX))
+
+	def _build_prefix_batches(self, route, nodes, command=None):
+		"""
+			Build the prefix entries of nodes in route.
+		"""
+		batches = []
+		link_to_port = self.awareness.link_to_port
+		for node in nodes:
+			datapath = self.datapaths.get(node)
+			port_pair = self.get_port_pair_from_link(link_to_port, node, route.next_hops[node])
+			if datapath and port_pair:
+				batches.append((datapath, [self.build_prefix_flow_mod(
+					datapath, route.prefix, port_pair[0], command=command)]))
+		return batches
+
+	def install_prefix_flow(self, path, flow_info, buffer_id, data=None):
+		"""
+			Install flow entries in 'prefix' routing mode.
+			The first datapath gets a per-flow entry, the other datapaths
+			along the path share one destination prefix entry per prefix.
+			Datapaths already routing the prefix are left as they are.
+		"""
+		if path is None or len(path) < 2:
+			self.logger.info("Path error!")
+			return
+		prefix = get_prefix(flow_info[2], setting.PREFIX_LEN)
+		route = self.prefix_routes.get(prefix)
+		if route is None:
+			route = self.prefix_routes[prefix] = PrefixRoute(prefix, path[-1])
+		elif route.dst_sw != path[-1]:
+			# The prefix is not behind a single switch, route the flow by itself.
+			self.install_flow(self.datapaths, self.awareness.link_to_port,
+							  path, flow_info, buffer_id, data)
+			return
+
+		in_port = flow_info[3]
+		first_dp = self.datapaths[path[0]]
+		port_pair = self.get_port_pair_from_link(self.awareness.link_to_port, path[0], path[1])
 		if port_pair is None:
 			self.logger.info("Port not found in first hop.")
 			return
 		out_port = port_pair[0]
-		self.send_flow_mod(first_dp, flow_info, in_port, out_port)
-		# Send packet_out to the first datapath.
-		self.send_packet_out(first_dp, buffer_id, in_port, out_port, data)
+
+		batches = self._build_prefix_batches(route, route.extend(path[1:]))
+		batches.append((first_dp, [self.build_flow_mod(first_dp, flow_info, in_port, out_port,
+													   self.get_path_id(path))]))
+		self.commit_flow_setup(batches, first_dp, buffer_id, in_port, out_port, data, flow_info, path)
+
+	def repoint_prefix_routes(self, best_paths):
+		"""
+			Move destination prefix entries onto the current best paths.
+			Only the datapaths whose next hop changes are modified, from the
+			destination outwards, and entries that are no longer used are
+			deleted after the new ones are confirmed.
+		"""
+		for route in self.prefix_routes.values():
+			changed, removed = route.rebuild(best_paths)
+			if not changed and not removed:
+				continue
+			self.logger.info("[PREFIX]%s/%s re-pointed at %s" % (
+				route.prefix[0], route.prefix[1], changed))
+			batches = self._build_prefix_batches(route, changed)
+			deletes = []
+			for node in removed:
+				datapath = self.datapaths.get(node)
+				if datapath:
+					deletes.append((datapath, [self.build_prefix_flow_mod(
+						datapath, route.prefix, None,
+						command=datapath.ofproto.OFPFC_DELETE_STRICT)]))
+
+			def _delete_unused(latency, confirmed, deletes=deletes):
+				for datapath, msgs in deletes:
+					for msg in msgs:
+						datapath.send_msg(msg)
+			self.flow_installer.install(batches, _delete_unused)
+
+	def build_wcmp_group_mod(self, datapath, route, command):
+		"""
+			Build the select group of route for datapath, one bucket per next hop.
+		"""
+		ofproto = datapath.ofproto
+		parser = datapath.ofproto_parser
+		buckets = []
+		if command != ofproto.OFPGC_DELETE:
+			link_to_port = self.awareness.link_to_port
+			for nxt, weight in zip(route.next_hops[datapath.id], route.weights[datapath.id]):
+				port_pair = self.get_port_pair_from_link(link_to_port, datapath.id, nxt)
+				if port_pair:
+					buckets.append(parser.OFPBucket(
+						weight=weight, watch_port=ofproto.OFPP_ANY, watch_group=ofproto.OFPG_ANY,
+						actions=[parser.OFPActionOutput(port_pair[0])]))
+		return parser.OFPGroupMod(datapath, command, ofproto.OFPGT_SELECT, route.group_id, buckets)
+
+	def build_wcmp_flow_mod(self, datapath, route, ip_dst, command=None):
+		"""
+			Build the entry sending the traffic to host ip_dst into the group of route.
+		"""
+		parser = datapath.ofproto_parser
+		match = parser.OFPMatch(eth_type=ether_types.ETH_TYPE_IP, ipv4_dst=ip_dst)
+		actions = [parser.OFPActionGroup(route.group_id)]
+		return self.build_flow(datapath, setting.WCMP_PRIORITY, match, actions,
+							   idle_timeout=0, hard_timeout=0, command=command,
+							   cookie=flow_cookie.make_cookie(flow_cookie.COOKIE_WCMP))
+
+	def _build_wcmp_batches(self, route, nodes, hosts):
+		"""
+			Build the groups of nodes in route, followed by the entries of hosts.
+		"""
+		batches = []
+		for node in nodes:
+			datapath = self.datapaths.get(node)
+			if datapath is None or node not in route.weights:
+				continue
+			msgs = [self.build_wcmp_group_mod(datapath, route, datapath.ofproto.OFPGC_ADD)]
+			msgs.extend(self.build_wcmp_flow_mod(datapath, route, ip) for ip in hosts)
+			batches.append((datapath, msgs))
+		return batches
+
+	def _get_wcmp_link_bw(self):
+		graph = self.monitor.graph
+		if graph is None:
+			return {}
+		return self.get_link_free_bw(graph)
+
+	def install_wcmp_flow(self, src_sw, dst_sw, flow_info, buffer_id, data=None):
+		"""
+			Install flow entries in 'wcmp' routing mode.
+			Every switch with a path to dst_sw gets a select group over its
+			next hops towards dst_sw, and one entry per destination host,
+			so flows are spread by the switches' hashing and only the first
+			packet to a host reaches the controller. The packet is sent
+			back to the flow table of the first datapath once confirmed.
+			Return False if src_sw has no WCMP route to dst_sw, the caller
+			sets the flow up along a single path then.
+		"""
+		route = self.wcmp_routes.get(dst_sw)
+		batches = []
+		if route is None:
+			route = self.wcmp_routes[dst_sw] = WcmpRoute(dst_sw, len(self.wcmp_routes) + 1)
+			route.update(self.awareness.shortest_paths, self._get_wcmp_link_bw(),
+						 self.monitor.capacity.get_max())
+			batches = self._build_wcmp_batches(route, route.next_hops, [])
+		if src_sw not in route.next_hops:
+			self.logger.info("No WCMP route from dpid:%s to dpid:%s" % (src_sw, dst_sw))
+			# The route is kept, so its groups must exist on the datapaths.
+			if batches:
+				self.flow_installer.install(self._coalesce(batches))
+			return False
+		ip_dst = flow_info[2]
+		if ip_dst not in route.hosts:
+			route.hosts.add(ip_dst)
+			for node in route.next_hops:
+				datapath = self.datapaths.get(node)
+				if datapath and node in route.weights:
+					batches.append((datapath, [self.build_wcmp_flow_mod(datapath, route, ip_dst)]))
+
+		first_dp = self.datapaths[src_sw]
+		in_port = flow_info[3]
+		self.commit_flow_setup(batches, first_dp, buffer_id, in_port,
+							   first_dp.ofproto.OFPP_TABLE, data, flow_info, [src_sw, dst_sw])
+		return True
+
+	def update_wcmp_routes(self):
+		"""
+			Follow the candidate paths and free bandwidth: reweight the
+			groups whose buckets have changed with OFPGC_MODIFY, set up the
+			switches new to a DAG, and delete the entries and groups of the
+			switches that have left it.
+		"""
+		link_bw = self._get_wcmp_link_bw()
+		default_bw = self.monitor.capacity.get_max()
+		for route in self.wcmp_routes.values():
+			added, changed, removed = route.update(self.awareness.shortest_paths, link_bw, default_bw,
+												   tolerance=setting.WCMP_WEIGHT_TOLERANCE)
+			batches = self._build_wcmp_batches(route, added, route.hosts)
+			for node in changed:
+				datapath = self.datapaths.get(node)
+				if datapath and node in route.weights:
+					batches.append((datapath, [self.build_wcmp_group_mod(
+						datapath, route, datapath.ofproto.OFPGC_MODIFY)]))
+			for node in removed:
+				datapath = self.datapaths.get(node)
+				if datapath:
+					ofproto = datapath.ofproto
+					msgs = [self.build_wcmp_flow_mod(datapath, route, ip, command=ofproto.OFPFC_DELETE_STRICT)
+							for ip in route.hosts]
+					msgs.append(self.build_wcmp_group_mod(datapath, route, ofproto.OFPGC_DELETE))
+					batches.append((datapath, msgs))
+			if batches:
+				self.flow_installer.install(self._coalesce(batches))
 
 	def get_L4_info(self, tcp_pkt, udp_pkt):
 		"""
@@ -375,12 +996,10 @@ class ShortestForwarding(app_manager.RyuApp):
 		if result:
 			src_sw, dst_sw = result[0], result[1]
 			if dst_sw:
-				# Path has already been calculated, just get it.
-				path = self.get_path(src_sw, dst_sw, weight=self.weight)
 				if setting.enable_Flow_Entry_L4Port:
-					pkt = packet.Packet(msg.data)
-					tcp_pkt = pkt.get_protocol(tcp.tcp)
-					udp_pkt = pkt.get_protocol(udp.udp)
+					view = get_packet_view(msg)
+					tcp_pkt = view.tcp
+					udp_pkt = view.udp
 					# Get ip_proto and L4 port number.
 					ip_proto, L4_port, Flag = self.get_L4_info(tcp_pkt, udp_pkt)
 					if ip_proto and L4_port and Flag:
@@ -390,15 +1009,33 @@ class ShortestForwarding(app_manager.RyuApp):
 							L4_Proto = 'UDP'
 						else:
 							pass
-						self.logger.info("[PATH]%s<-->%s(%s Port:%d): %s" % (ip_src, ip_dst, L4_Proto, L4_port, path))
 						flow_info = (eth_type, ip_src, ip_dst, in_port, ip_proto, Flag, L4_port)
 				else:
-					self.logger.info("[PATH]%s<-->%s: %s" % (ip_src, ip_dst, path))
 					flow_info = (eth_type, ip_src, ip_dst, in_port)
+
+				# The flow is already being installed, or installed.
+				record = self.flow_registry.lookup(self.get_flow_key(datapath.id, flow_info))
+				if record:
+					self.forward_duplicate(record, msg)
+					return
+
+				# Path has already been calculated, just get it.
+				path = self.get_path(src_sw, dst_sw, weight=self.weight,
+									 flow_info=flow_info if setting.ROUTING_MODE == 'flow' else None)
+				if len(flow_info) == 7:
+					self.logger.info("[PATH]%s<-->%s(%s Port:%d): %s" % (ip_src, ip_dst, L4_Proto, L4_port, path))
+				else:
+					self.logger.info("[PATH]%s<-->%s: %s" % (ip_src, ip_dst, path))
 				# Install flow entries to datapaths along the path.
-				self.install_flow(self.datapaths,
-								  self.awareness.link_to_port,
-								  path, flow_info, msg.buffer_id, msg.data)
+				if setting.ROUTING_MODE == 'prefix':
+					self.install_prefix_flow(path, flow_info, msg.buffer_id, msg.data)
+				elif setting.ROUTING_MODE == 'wcmp' and src_sw != dst_sw and \
+						self.install_wcmp_flow(src_sw, dst_sw, flow_info, msg.buffer_id, msg.data):
+					pass
+				else:
+					self.install_flow(self.datapaths,
+									  self.awareness.link_to_port,
+									  path, flow_info, msg.buffer_id, msg.data)
 		else:
 			# Flood is not good.
 			self.flood(msg)
@@ -0,0 +1,86 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+
+def load_capacity_manifest(fname):
+	"""
+		Load the capacity manifest written by the topology script.
+		The manifest is a JSON list of
+		{"dpid": dpid, "port": port_no, "peer": name, "capacity": Kbit/s}.
+		Return {(dpid, port_no):capacity,}.
+	"""
+	with open(fname) as f:
+		entries = json.load(f)
+	capacities = {}
+	for entry in entries:
+		capacities[(int(entry['dpid']), int(entry['port']))] = float(entry['capacity'])
+	return capacities
+
+
+class CapacityTable(object):
+	"""
+		Capacity of every switch port, unit: Kbit/s.
+		The capacity of a port comes from, in order of preference:
+		the capacity manifest, the 'curr_speed' of its port description,
+		and the default capacity.
+	"""
+
+	def __init__(self, default):
+		self.default = default
+		self.manifest = {}   # {(dpid, port_no):capacity,}
+		self.curr_speed = {}   # {(dpid, port_no):curr_speed,}
+		self._max = None
+
+	def load_manifest(self, fname):
+		self.manifest = load_capacity_manifest(fname)
+		self._max = None
+
+	def set_curr_speed(self, dpid, port_no, curr_speed):
+		"""
+			Record the 'curr_speed' (Kbit/s) of port, 0 means unknown.
+		"""
+		if curr_speed:
+			self.curr_speed[(dpid, port_no)] = curr_speed
+		else:
+			self.curr_speed.pop((dpid, port_no), None)
+		self._max = None
+
+	def remove(self, dpid, port_no):
+		self.curr_speed.pop((dpid, port_no), None)
+		self._max = None
+
+	def remove_switch(self, dpid):
+		for key in [key for key in self.curr_speed if key[0] == dpid]:
+			del self.curr_speed[key]
+		self._max = None
+
+	def get(self, dpid, port_no):
+		key = (dpid, port_no)
+		capacity = self.manifest.get(key)
+		if capacity is None:
+			capacity = self.curr_speed.get(key, self.default)
+		return capacity
+
+	def get_max(self):
+		"""
+			Largest capacity of all known ports, the upper bound of path bandwidth.
+		"""
+		if self._max is None:
+			keys = set(self.manifest) | set(self.curr_speed)
+			self._max = max([self.get(dpid, port_no) for dpid, port_no in keys] or [self.default])
+		return self._max
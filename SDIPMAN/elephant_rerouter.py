@@ -0,0 +1,104 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def get_path_links(path):
+	return [(path[i], path[i+1]) for i in xrange(len(path) - 1)]
+
+
+class ElephantRerouter(object):
+	"""
+		Decide which elephant flows to move to a wider path.
+		A flow is an elephant when its rate is at least `threshold` Kbit/s.
+		Elephants are taken from the fastest one down; each is moved to
+		the candidate path with the most bandwidth available to it (the
+		free bandwidth, plus its own rate on the links it already uses),
+		if that is more than `min_gain` Kbit/s above its current path.
+		The free bandwidth is updated after every move, so that two
+		elephants are not moved onto the same bottleneck. A moved flow
+		is not moved again within `holddown` seconds; after that, the
+		change of its rate is accounted as the measured gain.
+	"""
+
+	def __init__(self, threshold, min_gain, holddown):
+		self.threshold = threshold
+		self.min_gain = min_gain
+		self.holddown = holddown
+		self.moved = {}   # {key:(time of move, rate before the move),}
+		self.moves = 0   # Flows moved so far.
+		self.expected_gain = 0.0   # Sum of the expected gains of the moves, Kbit/s.
+		self.measured = 0   # Moves whose gain has been measured.
+		self.measured_gain = 0.0   # Sum of the measured rate changes of the moved flows, Kbit/s.
+
+	def hold(self, key, now, rate):
+		"""
+			Hold down a flow moved by someone else, e.g. the rebalancer.
+		"""
+		self.moved[key] = (now, rate)
+
+	def measure(self, flows, now):
+		"""
+			Account the rate change of the flows moved `holddown` ago.
+			flows = [(record, rate),], rate in Kbit/s.
+		"""
+		for record, rate in flows:
+			moved = self.moved.get(record.key)
+			if moved is not None and now - moved[0] >= self.holddown:
+				del self.moved[record.key]
+				self.measured += 1
+				self.measured_gain += rate - moved[1]
+		# Flows which ended before their gain could be measured.
+		for key in [key for key, moved in self.moved.items()
+					if now - moved[0] > 4 * self.holddown]:
+			del self.moved[key]
+
+	def plan(self, flows, get_candidates, link_bw, default_bw, now):
+		"""
+			Get the moves [(record, new_path, gain),], gain in Kbit/s.
+			flows = [(record, rate),], rate in Kbit/s.
+			get_candidates(src, dst) = [path,]
+			link_bw = {(src_dpid, dst_dpid):free bandwidth,}, the links not
+			in it have default_bw.
+		"""
+		moves = []
+		bw = dict(link_bw)
+		for record, rate in sorted(flows, key=lambda flow: flow[1], reverse=True):
+			if rate < self.threshold or record.key in self.moved:
+				continue
+			old_path = record.path
+			own_links = set(get_path_links(old_path))
+
+			def available(path):
+				return min([bw.get(link, default_bw) + (rate if link in own_links else 0)
+							for link in get_path_links(path)] or [default_bw])
+
+			candidates = get_candidates(old_path[0], old_path[-1])
+			if not candidates:
+				continue
+			new_path = max(candidates, key=available)
+			gain = available(new_path) - available(old_path)
+			if new_path == old_path or gain <= self.min_gain:
+				continue
+
+			moves.append((record, new_path, gain))
+			self.moved[record.key] = (now, rate)
+			self.moves += 1
+			self.expected_gain += gain
+			for link in own_links:
+				bw[link] = bw.get(link, default_bw) + rate
+			for link in get_path_links(new_path):
+				bw[link] = bw.get(link, default_bw) - rate
+		return moves
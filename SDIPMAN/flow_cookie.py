@@ -0,0 +1,46 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+	Cookies of the flow entries installed by SDIPMAN.
+	The top 8 bits carry the class of the entry, the low 56 bits the id
+	of the path it was installed for. Entries installed by others
+	(table-miss, LLDP, the proactive entries of the topology script)
+	have cookie 0, i.e. class COOKIE_NONE.
+"""
+
+COOKIE_NONE = 0
+COOKIE_FLOW = 1     # Per-flow entries of reactive forwarding.
+COOKIE_PREFIX = 2   # Destination prefix entries.
+COOKIE_WCMP = 3   # Destination host entries pointing to select groups.
+
+CLASS_SHIFT = 56
+CLASS_MASK = 0xff << CLASS_SHIFT
+PATH_ID_MASK = (1 << CLASS_SHIFT) - 1
+
+FLOW_TABLE_ID = 0   # All entries of SDIPMAN live in table 0.
+
+
+def make_cookie(cookie_class, path_id=0):
+	return (cookie_class << CLASS_SHIFT) | (path_id & PATH_ID_MASK)
+
+
+def get_cookie_class(cookie):
+	return (cookie & CLASS_MASK) >> CLASS_SHIFT
+
+
+def get_path_id(cookie):
+	return cookie & PATH_ID_MASK
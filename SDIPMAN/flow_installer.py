@@ -0,0 +1,104 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import time
+
+from ryu.lib import hub
+
+
+class _Batch(object):
+	def __init__(self, callback):
+		self.callback = callback
+		self.start = time.time()
+		self.waiting = set()   # set((dpid, xid),)
+		self.done = False
+
+
+class FlowInstaller(object):
+	"""
+		Send batches of OpenFlow messages and confirm them with barriers.
+		Messages of one datapath are sent back to back and closed by one
+		OFPBarrierRequest. The callback of a batch runs once every datapath
+		has answered its barrier, or after timeout seconds at the latest.
+		Note: Bundles need OpenFlow 1.4, while SDIPMAN speaks OpenFlow 1.3,
+		so barriers are the only confirmation used here.
+	"""
+
+	def __init__(self, logger, timeout=1.0, history=1000):
+		self.logger = logger
+		self.timeout = timeout
+		self.pending = {}   # {(dpid, xid):batch,}
+		self.latency = collections.deque(maxlen=history)   # Seconds of confirmed batches.
+		self.timeouts = 0
+
+	def install(self, batches, callback=None):
+		"""
+			batches = [(datapath, [msg,]),], sent in the given order.
+			callback(latency, confirmed) is called when the batch is done.
+		"""
+		batch = _Batch(callback)
+		for datapath, msgs in batches:
+			for msg in msgs:
+				datapath.send_msg(msg)
+			req = datapath.ofproto_parser.OFPBarrierRequest(datapath)
+			datapath.send_msg(req)   # xid is assigned by send_msg.
+			key = (datapath.id, req.xid)
+			batch.waiting.add(key)
+			self.pending[key] = batch
+		if batch.waiting:
+			hub.spawn_after(self.timeout, self._expire, batch)
+		else:
+			self._finish(batch, True)
+
+	def barrier_reply(self, msg):
+		"""
+			Handle OFPBarrierReply. Return True if it belongs to a batch.
+		"""
+		key = (msg.datapath.id, msg.xid)
+		batch = self.pending.pop(key, None)
+		if batch is None:
+			return False
+		batch.waiting.discard(key)
+		if not batch.waiting and not batch.done:
+			self._finish(batch, True)
+		return True
+
+	def _expire(self, batch):
+		if batch.done:
+			return
+		for key in batch.waiting:
+			self.pending.pop(key, None)
+		self.timeouts += 1
+		self.logger.info("Barrier reply timeout from datapaths %s" %
+						 sorted(dpid for dpid, xid in batch.waiting))
+		self._finish(batch, False)
+
+	def _finish(self, batch, confirmed):
+		batch.done = True
+		latency = time.time() - batch.start
+		if confirmed:
+			self.latency.append(latency)
+		if batch.callback:
+			batch.callback(latency, confirmed)
+
+	def get_latency_stats(self):
+		"""
+			Get (count, mean, max) of confirmed batch latency in seconds.
+		"""
+		if not self.latency:
+			return (0, 0.0, 0.0)
+		return (len(self.latency), sum(self.latency) / float(len(self.latency)), max(self.latency))
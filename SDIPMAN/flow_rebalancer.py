@@ -0,0 +1,113 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from elephant_rerouter import get_path_links
+
+
+class FlowRebalancer(object):
+	"""
+		Reassign flows to their candidate paths, so that the maximum link
+		utilization is minimized.
+		Local search from the current assignment: the flows on the most
+		utilized link are tried on their other candidate paths, and the
+		move that leaves the lowest utilization on the links it touches
+		is taken, as long as it stays below the current maximum. Only the
+		paths avoiding the most utilized link are tried. So only the flows
+		which have to move are moved, and the search stops after max_moves
+		moves or when no flow on the most utilized link can avoid it.
+	"""
+
+	def __init__(self, max_moves=64):
+		self.max_moves = max_moves
+
+	def rebalance(self, flows, get_candidates, get_capacity, link_load):
+		"""
+			flows = [(key, path, rate),], rate in Kbit/s.
+			get_candidates(src, dst) = [path,]
+			get_capacity(link) = capacity of link in Kbit/s.
+			link_load = {link:load,}, the measured load (Kbit/s) of links,
+			including the flows.
+			Return (moves, utilization before, utilization after),
+			moves = [(key, new_path),].
+		"""
+		paths = {}   # {key:path,}
+		rates = {}   # {key:rate,}
+		candidates = {}   # {key:[path,],}
+		on_link = {}   # {link:set(key,),}
+		load = dict(link_load)
+		for key, path, rate in flows:
+			paths[key] = path
+			rates[key] = rate
+			candidates[key] = get_candidates(path[0], path[-1]) or []
+			for link in get_path_links(path):
+				on_link.setdefault(link, set()).add(key)
+				load.setdefault(link, rate)
+		capacity = dict((link, float(get_capacity(link)) or 1.0) for link in load)
+
+		def utilization(link, delta=0):
+			return (load[link] + delta) / capacity[link]
+
+		for link in list(load):
+			# The measured load can lag behind the rates of new flows.
+			load[link] = max(load[link], sum(rates[key] for key in on_link.get(link, ())))
+
+		before = max([utilization(link) for link in on_link] or [0])
+		moved = {}   # {key:new_path,}
+		for i in xrange(self.max_moves):
+			hot = max(on_link, key=utilization) if on_link else None
+			if hot is None:
+				break
+			peak = utilization(hot)
+			best = None
+			for key in sorted(on_link[hot], key=lambda key: rates[key], reverse=True):
+				old_links = set(get_path_links(paths[key]))
+				for path in candidates[key]:
+					if path == paths[key]:
+						continue
+					new_links = set(get_path_links(path))
+					# Only a path avoiding the hot link can cool it down.
+					if hot in new_links:
+						continue
+					for link in new_links - old_links:
+						if link not in load:
+							load[link] = 0
+							capacity[link] = float(get_capacity(link)) or 1.0
+					affected = [utilization(link, -rates[key]) for link in old_links - new_links] + \
+						[utilization(link, rates[key]) for link in new_links - old_links]
+					worst = max(affected or [peak])
+					if worst < peak and (best is None or worst < best[0]):
+						best = (worst, key, path)
+			if best is None:
+				break
+
+			worst, key, path = best
+			old_links = set(get_path_links(paths[key]))
+			new_links = set(get_path_links(path))
+			for link in old_links - new_links:
+				load[link] -= rates[key]
+				on_link[link].discard(key)
+				if not on_link[link]:
+					del on_link[link]
+			for link in new_links - old_links:
+				load[link] += rates[key]
+				on_link.setdefault(link, set()).add(key)
+			paths[key] = path
+			moved[key] = path
+
+		after = max([utilization(link) for link in on_link] or [0])
+		original = dict((key, path) for key, path, rate in flows)
+		moves = [(key, path) for key, path in moved.items() if path != original[key]]
+		return moves, before, after
@@ -0,0 +1,124 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+
+PENDING = 'pending'
+INSTALLED = 'installed'
+
+
+class FlowRecord(object):
+	"""
+		Controller-side state of one flow set up along a path.
+		key = (first_dpid, eth_type, ip_src, ip_dst, in_port, ...)
+	"""
+
+	def __init__(self, key, path, in_port, out_port, expiry, path_id=0):
+		self.key = key
+		self.path = tuple(path)   # Like the interned candidate paths.
+		self.in_port = in_port
+		self.out_port = out_port
+		self.path_id = path_id   # In the cookie of the first-hop entry, kept by rerouting.
+		self.state = PENDING
+		self.expiry = expiry
+		self.installed_at = None
+		self.packet_count = 0   # Of the first-hop entry, in the last flow stats.
+		self.held = []   # [(buffer_id, data),], packets waiting for the setup.
+
+
+class FlowRegistry(object):
+	"""
+		Registry of pending and installed flows, keyed by match.
+		A record lives as long as the flow entries may live on the
+		datapaths without traffic, i.e. idle_timeout after installation.
+	"""
+
+	def __init__(self, idle_timeout, setup_timeout=1.0, max_held=64):
+		self.idle_timeout = idle_timeout
+		self.setup_timeout = setup_timeout
+		self.max_held = max_held
+		self.flows = {}   # {key:FlowRecord,}
+		self.suppressed = 0   # Duplicate packet_in not leading to a flow setup.
+		self._next_purge = time.time() + idle_timeout
+
+	def lookup(self, key):
+		"""
+			Get the live record of key, or None.
+		"""
+		record = self.flows.get(key)
+		if record is not None and record.expiry < time.time():
+			del self.flows[key]
+			return None
+		return record
+
+	def add(self, key, path, in_port, out_port, path_id=0):
+		"""
+			Register a flow whose entries are being installed.
+		"""
+		now = time.time()
+		if now >= self._next_purge:
+			self.purge(now)
+		record = FlowRecord(key, path, in_port, out_port,
+							now + self.setup_timeout + self.idle_timeout, path_id)
+		self.flows[key] = record
+		return record
+
+	def hold(self, record, buffer_id, data):
+		"""
+			Keep a duplicate packet of a pending flow until its entries are
+			confirmed. Return False if the record can not hold more packets.
+		"""
+		self.suppressed += 1
+		if record.state != PENDING or len(record.held) >= self.max_held:
+			return False
+		record.held.append((buffer_id, data))
+		return True
+
+	def installed(self, record):
+		"""
+			Mark the record as installed, return the packets held for it.
+		"""
+		record.state = INSTALLED
+		record.installed_at = time.time()
+		record.expiry = record.installed_at + self.idle_timeout
+		held, record.held = record.held, []
+		return held
+
+	def refresh(self, record, packet_count, since):
+		"""
+			Follow the idle timer of the first-hop entry of an installed
+			record. If the entry has counted packets since the last look,
+			which was taken after `since`, its last packet came after
+			`since` too, so the entry lives at least until
+			since + idle_timeout. The record never outlives the entry.
+		"""
+		if record.state == INSTALLED and packet_count != record.packet_count:
+			record.packet_count = packet_count
+			record.expiry = max(record.expiry, since + self.idle_timeout)
+
+	def remove(self, key):
+		return self.flows.pop(key, None)
+
+	def purge(self, now=None):
+		"""
+			Drop expired records.
+		"""
+		if now is None:
+			now = time.time()
+		for key in [key for key, record in self.flows.items() if record.expiry < now]:
+			del self.flows[key]
+		self._next_purge = now + self.idle_timeout
@@ -18,6 +18,7 @@
 
 import networkx as nx
 import matplotlib.pyplot as plt
+import multiprocessing
 import time
 
 from ryu import cfg
@@ -27,14 +28,15 @@ from ryu.controller.handler import MAIN_DISPATCHER
 from ryu.controller.handler import CONFIG_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
-from ryu.lib.packet import ipv4
-from ryu.lib.packet import arp
 from ryu.lib import hub
 from ryu.topology import event
 from ryu.topology.api import get_switch, get_link
 
+from packet_view import get_packet_view
+from path_engine import KShortestPathEngine
+from path_engine import k_shortest_paths_from, make_tasks
+from path_pool import PathPool
+from topology_graph import TopologyGraph
 import setting
 
 
@@ -50,43 +52,119 @@ class NetworkAwareness(app_manager.RyuApp):
 	"""
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
 
-	# List the event list should be listened.
-	events = [event.EventSwitchEnter,
-			  event.EventSwitchLeave, event.EventPortAdd,
-			  event.EventPortDelete, event.EventPortModify,
-			  event.EventLinkAdd, event.EventLinkDelete]
-
 	def __init__(self, *args, **kwargs):
 		super(NetworkAwareness, self).__init__(*args, **kwargs)
 		self.topology_api_app = self
 		self.name = "awareness"
 		self.link_to_port = {}                 # {(src_dpid,dst_dpid):(src_port,dst_port),}
 		self.access_table = {}                # {(sw,port):(ip, mac),}
+		self.ip_to_location = {}            # {ip:(sw,port),}
+		self.mac_to_location = {}         # {mac:(sw,port),}
 		self.switch_port_table = {}      # {dpid:set(port_num,),}
 		self.access_ports = {}                # {dpid:set(port_num,),}
 		self.interior_ports = {}              # {dpid:set(port_num,),}
 		self.switches = []                         # self.switches = [dpid,]
-		self.shortest_paths = {}            # {dpid:{dpid:[[path],],},}
+		self.topology_loaded = False
+		self.shortest_paths = {}            # PathTable, {dpid:{dpid:[(path),],},}
+		self.path_engine = KShortestPathEngine(k=CONF.k_paths, weight='weight',
+												pause=lambda: hub.sleep(0))
+		self.path_pool = None   # Started by the first job large enough to need it.
+		self.path_pool_size = setting.KSP_WORKERS or multiprocessing.cpu_count()
+		self.paths_event = hub.Event()
 		self.pre_link_to_port = {}
 		self.pre_access_table = {}
+		self.show_time = 0
 
 		# Directed graph can record the loading condition of links more accurately.
 		# self.graph = nx.Graph()
-		self.graph = nx.DiGraph()
+		self.topology = TopologyGraph()
 		self.start_time = time.time()
 
 		# Start a green thread to discover network resource.
 		self.discover_thread = hub.spawn(self._discover)
+		# Start a green thread to compute shortest paths off the event loop.
+		self.paths_thread = hub.spawn(self._compute_paths)
+
+	@property
+	def graph(self):
+		"""
+			Frozen snapshot of the switch graph, never modified by anyone.
+		"""
+		return self.topology.snapshot()
 
 	def _discover(self):
-		i = 0
 		while True:
 			self.show_topology()
-			if i == 2:   # Reload topology every 20 seconds.
-				self.get_topology(None)
-				i = 0
+			if not self.topology_loaded:
+				self.get_topology()
 			hub.sleep(setting.DISCOVERY_PERIOD)
-			i = i + 1
+
+	def _compute_paths(self):
+		"""
+			Recompute K shortest paths whenever the graph has changed.
+			A burst of link events is taken in with one snapshot.
+			self.shortest_paths is replaced only when the new snapshot is
+			complete, so forwarding keeps using the previous one meanwhile.
+		"""
+		while True:
+			self.paths_event.wait()
+			self.paths_event.clear()
+			graph = self.graph
+			plan = self.path_engine.plan(graph)
+			if plan is None:
+				continue
+			jobs, removed_nodes = plan
+			results = self.compute_k_paths(graph, jobs)
+			self.path_engine.apply(results, removed_nodes)
+			self.shortest_paths = self.path_engine.paths
+			self.logger.info("[SHORTEST PATHS UPDATED] %d pairs recomputed" %
+							 sum(len(dsts) for dsts in jobs.values()))
+
+	def compute_k_paths(self, graph, jobs):
+		"""
+			Compute K shortest paths of jobs = {src:set(dst,),}.
+			Large jobs are spread over the worker processes by source node,
+			and the green thread waits on green pipes, so that packet_in,
+			stats replies and echo handling go on while paths are computed.
+		"""
+		weight = self.path_engine.weight
+		k = self.path_engine.k
+		n_pairs = sum(len(dsts) for dsts in jobs.values())
+		if n_pairs >= setting.KSP_POOL_MIN_PAIRS and self.path_pool_size > 1 and self.path_pool is None:
+			self.create_path_pool()
+		pool = self.path_pool
+		if pool is not None and n_pairs >= setting.KSP_POOL_MIN_PAIRS:
+			tasks = make_tasks(graph, jobs, weight=weight, k=k, n_tasks=len(pool))
+			try:
+				results = {}
+				for result in pool.map(tasks):
+					results.update(result)
+				return results
+			except Exception:
+				self.logger.exception("Path computation in worker processes failed")
+				# Do not try again, compute paths in this process.
+				pool.close()
+				self.path_pool = None
+				self.path_pool_size = 0
+
+		results = {}
+		for src, dsts in jobs.items():
+			results[src] = k_shortest_paths_from(graph, src, dsts, weight=weight, k=k)
+			# Yield to other green threads between sources.
+			hub.sleep(0)
+		return results
+
+	def create_path_pool(self):
+		"""
+			Start the worker processes, or compute paths in this process
+			if they can not be started.
+		"""
+		try:
+			self.path_pool = PathPool(self.path_pool_size)
+		except (OSError, ValueError):
+			self.logger.exception("Can not create path computation pool")
+			self.path_pool = None
+			self.path_pool_size = 0
 
 	def add_flow(self, dp, priority, match, actions, idle_timeout=0, hard_timeout=0):
 		ofproto = dp.ofproto
@@ -123,9 +201,9 @@ class NetworkAwareness(app_manager.RyuApp):
 		msg = ev.msg
 		datapath = msg.datapath
 		in_port = msg.match['in_port']
-		pkt = packet.Packet(msg.data)
-		arp_pkt = pkt.get_protocol(arp.arp)
-		ip_pkt = pkt.get_protocol(ipv4.ipv4)
+		view = get_packet_view(msg)
+		arp_pkt = view.arp
+		ip_pkt = view.ipv4
 
 		if arp_pkt:
 			arp_src_ip = arp_pkt.src_ip
@@ -134,19 +212,77 @@ class NetworkAwareness(app_manager.RyuApp):
 			self.register_access_info(datapath.id, in_port, arp_src_ip, mac)
 		elif ip_pkt:
 			ip_src_ip = ip_pkt.src
-			eth = pkt.get_protocols(ethernet.ethernet)[0]
-			mac = eth.src
+			mac = view.eth.src
 			# Record the access infomation.
 			self.register_access_info(datapath.id, in_port, ip_src_ip, mac)
 		else:
 			pass
 
-	@set_ev_cls(events)
-	def get_topology(self, ev):
+	@set_ev_cls(event.EventPortAdd)
+	def _port_add_handler(self, ev):
+		"""
+			Add the new port to the access ports, until a link is found on it.
+		"""
+		if not self.topology_loaded:
+			return
+		port = ev.port
+		self.switch_port_table.setdefault(port.dpid, set()).add(port.port_no)
+		if port.port_no not in self.interior_ports.setdefault(port.dpid, set()):
+			self.access_ports.setdefault(port.dpid, set()).add(port.port_no)
+
+	@set_ev_cls(event.EventPortDelete)
+	def _port_delete_handler(self, ev):
+		"""
+			Invalidate the host attached to the deleted port.
+		"""
+		port = ev.port
+		self.unregister_access_info(port.dpid, port.port_no)
+		for table in (self.switch_port_table, self.access_ports, self.interior_ports):
+			table.get(port.dpid, set()).discard(port.port_no)
+
+	@set_ev_cls(event.EventSwitchEnter)
+	def _switch_enter_handler(self, ev):
+		"""
+			Add the switch to the graph, all its ports are access ports
+			until links are found on them.
 		"""
-			Get topology info and calculate shortest paths.
+		if not self.topology_loaded:
+			return
+		dpid = ev.switch.dp.id
+		if dpid not in self.switches:
+			self.switches.append(dpid)
+		self.switch_port_table[dpid] = set(port.port_no for port in ev.switch.ports)
+		interior_port = self.interior_ports.setdefault(dpid, set())
+		self.access_ports[dpid] = self.switch_port_table[dpid] - interior_port
+		if self.topology.add_switch(dpid):
+			self.paths_event.set()
+
+	@set_ev_cls(event.EventSwitchLeave)
+	def _switch_leave_handler(self, ev):
+		"""
+			Invalidate all hosts attached to the leaving switch, and
+			remove it and its links from the tables and the graph.
+		"""
+		dpid = ev.switch.dp.id
+		for port_no in list(self.access_ports.get(dpid, ())):
+			self.unregister_access_info(dpid, port_no)
+		if dpid in self.switches:
+			self.switches.remove(dpid)
+		for table in (self.switch_port_table, self.access_ports, self.interior_ports):
+			table.pop(dpid, None)
+		for link in [link for link in self.link_to_port if dpid in link]:
+			del self.link_to_port[link]
+		if self.topology.remove_switch(dpid):
+			self.paths_event.set()
+
+	def get_topology(self):
+		"""
+			Load the whole topology once, and calculate shortest paths.
+			Afterwards, it is kept up to date by the switch, port and link
+			event handlers, one change at a time.
 			Note: In looped network, we should get the topology
-			20 or 30 seconds after the network went up.
+			20 or 30 seconds after the network went up, before that, the
+			ports of undiscovered links would be taken for access ports.
 		"""
 		present_time = time.time()
 		if present_time - self.start_time < setting.get_topology_delay:
@@ -159,35 +295,74 @@ class NetworkAwareness(app_manager.RyuApp):
 		links = get_link(self.topology_api_app, None)
 		self.create_interior_links(links)
 		self.create_access_ports()
-		self.graph = self.get_graph(self.link_to_port.keys())
-		self.shortest_paths = self.all_k_shortest_paths(
-			self.graph, weight='weight', k=CONF.k_paths)
+		self.topology_loaded = True
+		if self.topology.sync(self.switches, self.link_to_port):
+			self.paths_event.set()
+
+	@set_ev_cls(event.EventLinkAdd)
+	def _link_add_handler(self, ev):
+		"""
+			Add the discovered link to link_to_port and the graph, its
+			ports become interior ports.
+		"""
+		if not self.topology_loaded:
+			return
+		src = ev.link.src
+		dst = ev.link.dst
+		self.link_to_port[(src.dpid, dst.dpid)] = (src.port_no, dst.port_no)
+		for port in (src, dst):
+			if port.dpid in self.interior_ports:
+				self.interior_ports[port.dpid].add(port.port_no)
+				self.access_ports.get(port.dpid, set()).discard(port.port_no)
+				# A host seen on the port before the link was found is not one.
+				self.unregister_access_info(port.dpid, port.port_no)
+		if self.topology.add_link(src.dpid, dst.dpid):
+			self.paths_event.set()
+
+	@set_ev_cls(event.EventLinkDelete)
+	def _link_delete_handler(self, ev):
+		"""
+			Remove the lost link from link_to_port and the graph. Its ports
+			go back to the access ports, unless the reverse link still
+			uses them.
+		"""
+		src = ev.link.src
+		dst = ev.link.dst
+		link = (src.dpid, dst.dpid)
+		if self.link_to_port.get(link) != (src.port_no, dst.port_no):
+			return
+		del self.link_to_port[link]
+		if self.link_to_port.get((dst.dpid, src.dpid)) != (dst.port_no, src.port_no):
+			for port in (src, dst):
+				self.interior_ports.get(port.dpid, set()).discard(port.port_no)
+				if port.port_no in self.switch_port_table.get(port.dpid, ()):
+					self.access_ports[port.dpid].add(port.port_no)
+		if self.topology.remove_link(src.dpid, dst.dpid):
+			self.paths_event.set()
 
 	def get_host_location(self, host_ip):
 		"""
 			Get host location info ((datapath, port)) according to the host ip.
-			self.access_table = {(sw,port):(ip, mac),}
+			self.ip_to_location = {ip:(sw,port),}
 		"""
-		for key in self.access_table.keys():
-			if self.access_table[key][0] == host_ip:
-				return key
-		self.logger.info("%s location is not found." % host_ip)
-		return None
+		location = self.ip_to_location.get(host_ip)
+		if location is None:
+			self.logger.info("%s location is not found." % host_ip)
+		return location
 
-	def get_graph(self, link_list):
+	def get_host_location_by_mac(self, host_mac):
+		"""
+			Get host location info ((datapath, port)) according to the host mac.
+			self.mac_to_location = {mac:(sw,port),}
 		"""
-			Get Adjacency matrix from link_to_port.
+		return self.mac_to_location.get(host_mac)
+
+	def get_host(self, dpid, port_no):
+		"""
+			Get host info ((ip, mac)) attached to the access port.
+			self.access_table = {(sw,port):(ip, mac),}
 		"""
-		_graph = self.graph.copy()
-		for src in self.switches:
-			for dst in self.switches:
-				if src == dst:
-					_graph.add_edge(src, dst, weight=0)
-				elif (src, dst) in link_list:
-					_graph.add_edge(src, dst, weight=1)
-				else:
-					pass
-		return _graph
+		return self.access_table.get((dpid, port_no))
 
 	def create_port_map(self, switch_list):
 		"""
@@ -228,58 +403,49 @@ class NetworkAwareness(app_manager.RyuApp):
 			# That comes the access port of the switch.
 			self.access_ports[sw] = all_port_table - interior_port
 
-	def k_shortest_paths(self, graph, src, dst, weight='weight', k=5):
-		"""
-			Creat K shortest paths from src to dst.
-			generator produces lists of simple paths, in order from shortest to longest.
-		"""
-		generator = nx.shortest_simple_paths(graph, source=src, target=dst, weight=weight)
-		shortest_paths = []
-		try:
-			for path in generator:
-				if k <= 0:
-					break
-				shortest_paths.append(path)
-				k -= 1
-			return shortest_paths
-		except:
-			self.logger.debug("No path between %s and %s" % (src, dst))
-
-	def all_k_shortest_paths(self, graph, weight='weight', k=5):
-		"""
-			Creat all K shortest paths between datapaths.
-			Note: We get shortest paths for bandwidth-sensitive
-			traffic from bandwidth-sensitive switches.
-		"""
-		_graph = graph.copy()
-		paths = {}
-		# Find k shortest paths in graph.
-		for src in _graph.nodes():
-			paths.setdefault(src, {src: [[src] for i in xrange(k)]})
-			for dst in _graph.nodes():
-				if src == dst:
-					continue
-				paths[src].setdefault(dst, [])
-				paths[src][dst] = self.k_shortest_paths(_graph, src, dst, weight=weight, k=k)
-		return paths
-
 	def register_access_info(self, dpid, in_port, ip, mac):
 		"""
-			Register access host info into access table.
+			Register access host info into access table, and keep
+			the ip and mac indexes consistent with it.
 		"""
 		if in_port in self.access_ports[dpid]:
-			if (dpid, in_port) in self.access_table:
-				if self.access_table[(dpid, in_port)] == (ip, mac):
-					return
-				else:
-					self.access_table[(dpid, in_port)] = (ip, mac)
-					return
-			else:
-				self.access_table.setdefault((dpid, in_port), None)
-				self.access_table[(dpid, in_port)] = (ip, mac)
+			location = (dpid, in_port)
+			if self.access_table.get(location) == (ip, mac):
 				return
+			# The port is reused by another host, or the host has moved.
+			self.unregister_access_info(dpid, in_port)
+			for old_location in (self.ip_to_location.get(ip), self.mac_to_location.get(mac)):
+				if old_location is not None:
+					self.unregister_access_info(old_location[0], old_location[1])
+			self.access_table[location] = (ip, mac)
+			self.ip_to_location[ip] = location
+			self.mac_to_location[mac] = location
+
+	def unregister_access_info(self, dpid, port_no):
+		"""
+			Remove access host info from access table and indexes.
+		"""
+		host = self.access_table.pop((dpid, port_no), None)
+		if host is None:
+			return
+		ip, mac = host
+		if self.ip_to_location.get(ip) == (dpid, port_no):
+			del self.ip_to_location[ip]
+		if self.mac_to_location.get(mac) == (dpid, port_no):
+			del self.mac_to_location[mac]
 
 	def show_topology(self):
+		"""
+			Print the changed tables, at most once every setting.TOSHOW_INTERVAL.
+			The same data is served by the REST API without printing.
+		"""
+		if not setting.TOSHOW_topo:
+			return
+		now = time.time()
+		if now - self.show_time < setting.TOSHOW_INTERVAL:
+			return
+		self.show_time = now
+
 		if self.pre_link_to_port != self.link_to_port and setting.TOSHOW_topo:
 			# It means the link_to_port table has changed.
 			_graph = self.graph.copy()
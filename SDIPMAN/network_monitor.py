@@ -17,29 +17,71 @@
 # limitations under the License.
 
 from __future__ import division
-import copy
 from operator import attrgetter
+import time
+
+import networkx as nx
 
 from ryu import cfg
 from ryu.base import app_manager
 from ryu.base.app_manager import lookup_service_brick
+from ryu.controller import event
 from ryu.controller import ofp_event
 from ryu.controller.handler import MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib import hub
 
+import flow_cookie
+from capacity_table import CapacityTable
+from path_selector import BandwidthPathSelector
+from poll_scheduler import PollScheduler
+from rate_estimator import RateEstimator
+from recorder import Recorder
+from stats_store import save_sample
+from widest_path import widest_paths_from
 import setting
 
 
 CONF = cfg.CONF
 
 
+class EventBestPathsUpdate(event.EventBase):
+	"""
+		Event raised after a new best path table has been published.
+	"""
+	def __init__(self, capabilities, best_paths):
+		super(EventBestPathsUpdate, self).__init__()
+		self.capabilities = capabilities
+		self.best_paths = best_paths
+
+
+def get_flow_info(match):
+	"""
+		Get the flow_info of a per-flow entry from its match, as built by
+		SDIPMAN.build_flow_mod(), or None if it is not such an entry.
+		flow_info = (eth_type, ipv4_src, ipv4_dst, in_port)
+		or
+		flow_info = (eth_type, ipv4_src, ipv4_dst, in_port, ip_proto, Flag, L4_port)
+	"""
+	ipv4_src = match.get('ipv4_src')
+	ipv4_dst = match.get('ipv4_dst')
+	if not (ipv4_src and ipv4_dst):
+		return None
+	flow_info = (match.get('eth_type'), ipv4_src, ipv4_dst, match.get('in_port'))
+	for field, flag in (('tcp_src', 'src'), ('tcp_dst', 'dst'), ('udp_src', 'src'), ('udp_dst', 'dst')):
+		L4_port = match.get(field)
+		if L4_port is not None:
+			return flow_info + (match.get('ip_proto'), flag, L4_port)
+	return flow_info
+
+
 class NetworkMonitor(app_manager.RyuApp):
 	"""
 		NetworkMonitor is a Ryu app for collecting traffic information.
 	"""
 	OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
+	_EVENTS = [EventBestPathsUpdate]
 
 	def __init__(self, *args, **kwargs):
 		super(NetworkMonitor, self).__init__(*args, **kwargs)
@@ -49,47 +91,118 @@ class NetworkMonitor(app_manager.RyuApp):
 		self.port_speed = {}
 		self.flow_stats = {}
 		self.flow_speed = {}
+		self.flow_entries = {}   # {dpid:{flow_info:(cookie, packet_count, speed),},}
+		self.flow_request_time = {}   # {dpid:time of the last flow stats request,}
+		self.flow_entries_time = {}   # {dpid:(request time of the last reply, of the reply before),}
+		self._flow_parts = {}   # {dpid:(body, entries, totals),}, of a multipart reply still coming.
 		self.stats = {}
 		self.port_features = {}
 		self.free_bandwidth = {}   # self.free_bandwidth = {dpid:{port_no:free_bw,},} unit:Kbit/s
+		self.capacity = CapacityTable(setting.MAX_CAPACITY)
+		self.port_rate = self._create_rate_estimator()   # {(dpid, port_no):tx rate,}
+		self.flow_rate = self._create_rate_estimator()   # {(dpid,) + flow_info:rate,}
+		self.show_time = {}   # {_type:time of last print,}
+		self.recorder = None
+		if setting.RECORD_DIR:
+			self.recorder = Recorder(setting.RECORD_DIR)
+		if setting.CAPACITY_MANIFEST:
+			try:
+				self.capacity.load_manifest(setting.CAPACITY_MANIFEST)
+			except (IOError, ValueError, KeyError) as e:
+				self.logger.warning("Failed to load capacity manifest %s: %s" % (setting.CAPACITY_MANIFEST, e))
 		self.awareness = lookup_service_brick('awareness')
 		self.graph = None
 		self.capabilities = None
 		self.best_paths = None
+		self.path_selector = None
+		self.poll_scheduler = PollScheduler(
+			setting.MONITOR_PERIOD, setting.POLL_MIN_INTERVAL, setting.POLL_MAX_INTERVAL,
+			high_utilization=setting.POLL_HIGH_UTILIZATION,
+			fast_change=setting.POLL_FAST_CHANGE)
 
 		# Start to green thread to monitor traffic and calculating
 		# free bandwidth of links respectively.
 		self.monitor_thread = hub.spawn(self._monitor)
+		self.poll_thread = hub.spawn(self._poll)
 		self.save_freebandwidth_thread = hub.spawn(self._save_bw_graph)
 
+	def _create_rate_estimator(self):
+		return RateEstimator(setting.RATE_ESTIMATOR,
+							 alpha=setting.RATE_EWMA_ALPHA,
+							 window=setting.RATE_WINDOW,
+							 outlier_factor=setting.RATE_OUTLIER_FACTOR,
+							 outlier_hold=setting.RATE_OUTLIER_HOLD,
+							 outlier_floor=setting.RATE_OUTLIER_FLOOR,
+							 trend_beta=setting.RATE_TREND_BETA)
+
 	def _monitor(self):
 		"""
 			Main entry method of monitoring traffic.
+			Stats requests are sent by self._poll on a per-datapath schedule,
+			here the replies received in each period are shown.
 		"""
-		while CONF.weight == 'bw':
+		while CONF.weight in ('bw', 'widest'):
 			self.stats['flow'] = {}
 			self.stats['port'] = {}
-			for dp in self.datapaths.values():
-				self.port_features.setdefault(dp.id, {})
-				self._request_stats(dp)
-			# Refresh data.
-			self.capabilities = None
-			self.best_paths = None
 			hub.sleep(setting.MONITOR_PERIOD)
+			if self.recorder:
+				self.recorder.flush()
 			if self.stats['flow'] or self.stats['port']:
 				self.show_stat('flow')
 				self.show_stat('port')
 				hub.sleep(1)
 
+	def _poll(self):
+		"""
+			Send stats requests to the datapaths that are due.
+		"""
+		while CONF.weight in ('bw', 'widest'):
+			for dpid in self.poll_scheduler.due(time.time()):
+				datapath = self.datapaths.get(dpid)
+				if datapath:
+					self._request_stats(datapath)
+			hub.sleep(setting.POLL_TICK)
+
+	def get_poll_rates(self):
+		"""
+			Get the effective stats polling rate of every datapath.
+			poll_rates = {dpid:polls per second,}
+		"""
+		return self.poll_scheduler.get_rates()
+
 	def _save_bw_graph(self):
 		"""
-			Save bandwidth data into networkx graph object.
+			Save bandwidth data into networkx graph object, and then
+			recompute best paths against it in the background.
 		"""
-		while CONF.weight == 'bw':
+		while CONF.weight in ('bw', 'widest'):
 			self.graph = self.create_bw_graph(self.free_bandwidth)
 			self.logger.debug("save free bandwidth")
+			self.update_best_paths()
 			hub.sleep(setting.MONITOR_PERIOD)
 
+	def update_best_paths(self):
+		"""
+			Publish a new best path table.
+			The table is built aside and then swapped in with one assignment,
+			the published dicts are never modified afterwards, so readers
+			in packet_in handlers always see a complete snapshot.
+		"""
+		if self.awareness is None or self.graph is None:
+			return
+		if CONF.weight == 'widest':
+			self.capabilities, self.best_paths = self.get_widest_paths(self.graph)
+		else:
+			shortest_paths = self.awareness.shortest_paths
+			if not shortest_paths:
+				return
+			self.capabilities, self.best_paths = self.get_best_path_by_bw(
+				self.graph, shortest_paths)
+		if self.recorder:
+			self.recorder.record_paths(time.time(), self.best_paths, self.capabilities)
+		self.send_event_to_observers(
+			EventBestPathsUpdate(self.capabilities, self.best_paths))
+
 	@set_ev_cls(ofp_event.EventOFPStateChange,
 				[MAIN_DISPATCHER, DEAD_DISPATCHER])
 	def _state_change_handler(self, ev):
@@ -101,10 +214,24 @@ class NetworkMonitor(app_manager.RyuApp):
 			if not datapath.id in self.datapaths:
 				self.logger.debug('register datapath: %016x', datapath.id)
 				self.datapaths[datapath.id] = datapath
+				# Port descriptions are requested once, and then kept
+				# up to date by port status messages.
+				self.port_features.setdefault(datapath.id, {})
+				req = datapath.ofproto_parser.OFPPortDescStatsRequest(datapath, 0)
+				datapath.send_msg(req)
+				self.poll_scheduler.add(datapath.id, time.time())
 		elif ev.state == DEAD_DISPATCHER:
 			if datapath.id in self.datapaths:
 				self.logger.debug('unregister datapath: %016x', datapath.id)
 				del self.datapaths[datapath.id]
+				self.port_features.pop(datapath.id, None)
+				self.capacity.remove_switch(datapath.id)
+				self.port_rate.remove_if(lambda key: key[0] == datapath.id)
+				self.flow_rate.remove_if(lambda key: key[0] == datapath.id)
+				self.flow_entries.pop(datapath.id, None)
+				self.flow_entries_time.pop(datapath.id, None)
+				self._flow_parts.pop(datapath.id, None)
+				self.poll_scheduler.remove(datapath.id)
 		else:
 			pass
 
@@ -113,44 +240,76 @@ class NetworkMonitor(app_manager.RyuApp):
 		"""
 			Save flow stats reply information into self.flow_stats.
 			Calculate flow speed and Save it.
+			The speed of every entry is smoothed by self.flow_rate, and the
+			entries which have expired are forgotten. The entries with the
+			same (priority, ipv4_src, ipv4_dst), i.e. with different L4
+			ports, are summed up in self.flow_stats and self.flow_speed.
+			self.flow_entries = {dpid:{flow_info:(cookie, packet_count, speed),},}
+			flow_info as in SDIPMAN.build_flow_mod(), see get_flow_info().
 			(old) self.flow_stats = {dpid:{(in_port, ipv4_dst, out-port):[(packet_count, byte_count, duration_sec,  duration_nsec),],},}
 			(old) self.flow_speed = {dpid:{(in_port, ipv4_dst, out-port):[speed,],},}
-			(new) self.flow_stats = {dpid:{(priority, ipv4_src, ipv4_dst):[(packet_count, byte_count, duration_sec,  duration_nsec),],},}
-			(new) self.flow_speed = {dpid:{(priority, ipv4_src, ipv4_dst):[speed,],},}
+			(new) self.flow_stats = {dpid:{(priority, ipv4_src, ipv4_dst):RingBuffer[(packet_count, byte_count, duration_sec,  duration_nsec),],},}
+			(new) self.flow_speed = {dpid:{(priority, ipv4_src, ipv4_dst):RingBuffer[speed,],},}
 			Because the proactive flow entrys don't have 'in_port' and 'out-port' field.
-			Note: table-miss, LLDP and ARP flow entries are not what we need, just filter them.
+			Note: Only per-flow entries installed by SDIPMAN are requested (by cookie),
+			so table-miss, LLDP, ARP and proactive flow entries are not in the reply.
+			A reply can come in several parts (OFPMPF_REPLY_MORE), the tables
+			are replaced and pruned only once the last part is in.
 		"""
-		body = ev.msg.body
-		dpid = ev.msg.datapath.id
+		msg = ev.msg
+		dpid = msg.datapath.id
+		body, entries, totals = self._flow_parts.pop(dpid, ([], {}, {}))
+		# totals = {(priority, ipv4_src, ipv4_dst):[packet_count, byte_count, duration_sec, duration_nsec, speed],}
+		body.extend(msg.body)
+		for stat in msg.body:
+			flow_info = get_flow_info(stat.match)
+			if flow_info is None:
+				continue
+			# Get flow's speed.
+			speed = self.flow_rate.update((dpid,) + flow_info, stat.byte_count,
+										  stat.duration_sec + stat.duration_nsec / 1000000000.0)
+			entries[flow_info] = (stat.cookie, stat.packet_count, speed)
+			key = (stat.priority, flow_info[1], flow_info[2])
+			total = totals.setdefault(key, [0, 0, 0, 0, 0])
+			total[0] += stat.packet_count
+			total[1] += stat.byte_count
+			if (stat.duration_sec, stat.duration_nsec) > (total[2], total[3]):
+				total[2], total[3] = stat.duration_sec, stat.duration_nsec
+			total[4] += speed
+		if msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE:
+			self._flow_parts[dpid] = (body, entries, totals)
+			return
+
 		self.stats['flow'][dpid] = body
-		self.flow_stats.setdefault(dpid, {})
-		self.flow_speed.setdefault(dpid, {})
-		for stat in sorted([flow for flow in body if ((flow.priority not in [0, 65535]) and (flow.match.get('ipv4_src')) and (flow.match.get('ipv4_dst')))],
-						   key=lambda flow: (flow.priority, flow.match.get('ipv4_src'), flow.match.get('ipv4_dst'))):
-			key = (stat.priority, stat.match.get('ipv4_src'), stat.match.get('ipv4_dst'))
-			value = (stat.packet_count, stat.byte_count,
-					 stat.duration_sec, stat.duration_nsec)
-			self._save_stats(self.flow_stats[dpid], key, value, 5)
-
-			# Get flow's speed and Save it.
-			pre = 0
-			period = setting.MONITOR_PERIOD
-			tmp = self.flow_stats[dpid][key]
-			if len(tmp) > 1:
-				pre = tmp[-2][1]
-				period = self._get_period(tmp[-1][2], tmp[-1][3],
-										  tmp[-2][2], tmp[-2][3])
-			speed = self._get_speed(self.flow_stats[dpid][key][-1][1],
-									pre, period)
-			self._save_stats(self.flow_speed[dpid], key, speed, 5)
+		flow_stats = self.flow_stats.setdefault(dpid, {})
+		flow_speed = self.flow_speed.setdefault(dpid, {})
+		for key, total in totals.items():
+			self._save_stats(flow_stats, key, tuple(total[:4]), 5)
+			self._save_stats(flow_speed, key, total[4], 5)
+		for key in [key for key in flow_stats if key not in totals]:
+			del flow_stats[key]
+			flow_speed.pop(key, None)
+		for flow_info in self.flow_entries.get(dpid, ()):
+			if flow_info not in entries:
+				self.flow_rate.remove((dpid,) + flow_info)
+		self.flow_entries[dpid] = entries
+		self.flow_entries_time[dpid] = (self.flow_request_time.get(dpid, 0),
+										self.flow_entries_time.get(dpid, (0, 0))[0])
+
+		if self.recorder:
+			keys = list(totals)
+			self.recorder.record_flows(time.time(), dpid, keys,
+									   [flow_speed[key][-1] for key in keys])
 
 	@set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
 	def _port_stats_reply_handler(self, ev):
 		"""
 			Save port's stats information into self.port_stats.
 			Calculate port speed and Save it.
-			self.port_stats = {(dpid, port_no):[(tx_bytes, rx_bytes, rx_errors, duration_sec,  duration_nsec),],}
-			self.port_speed = {(dpid, port_no):[speed,],}
+			The speed is smoothed by self.port_rate, free bandwidth uses
+			its prediction for the next period.
+			self.port_stats = {(dpid, port_no):RingBuffer[(tx_bytes, rx_bytes, rx_errors, duration_sec,  duration_nsec),],}
+			self.port_speed = {(dpid, port_no):RingBuffer[speed,],}
 			Note: The transmit performance and receive performance are independent of a port.
 			We calculate the load of a port only using tx_bytes.
 		"""
@@ -158,6 +317,8 @@ class NetworkMonitor(app_manager.RyuApp):
 		dpid = ev.msg.datapath.id
 		self.stats['port'][dpid] = body
 		self.free_bandwidth.setdefault(dpid, {})
+		max_utilization = 0
+		max_change = 0
 		for stat in sorted(body, key=attrgetter('port_no')):
 			port_no = stat.port_no
 			if port_no != ofproto_v1_3.OFPP_LOCAL:
@@ -167,26 +328,54 @@ class NetworkMonitor(app_manager.RyuApp):
 				self._save_stats(self.port_stats, key, value, 5)
 
 				# Get port speed and Save it.
-				pre = 0
-				period = setting.MONITOR_PERIOD
-				tmp = self.port_stats[key]
-				if len(tmp) > 1:
-					# Calculate only the tx_bytes, not the rx_bytes. (hmc)
-					pre = tmp[-2][0]
-					period = self._get_period(tmp[-1][3], tmp[-1][4], tmp[-2][3], tmp[-2][4])
-				speed = self._get_speed(self.port_stats[key][-1][0], pre, period)
-				self._save_stats(self.port_speed, key, speed, 5)
-				self._save_freebandwidth(dpid, port_no, speed)
+				# Calculate only the tx_bytes, not the rx_bytes. (hmc)
+				speed = self.port_rate.update(key, stat.tx_bytes,
+											  stat.duration_sec + stat.duration_nsec / 1000000000.0)
+				speeds = self._save_stats(self.port_speed, key, speed, 5)
+				self._save_freebandwidth(dpid, port_no,
+										 self.port_rate.predict(key, setting.MONITOR_PERIOD))
+
+				# Utilization of the port, for the polling scheduler.
+				capacity = self._get_port_capacity(dpid, port_no)
+				max_utilization = max(max_utilization, speed * 8 / 1000.0 / capacity)
+				if len(speeds) > 1:
+					max_change = max(max_change, abs(speeds[-1] - speeds[-2]) * 8 / 1000.0 / capacity)
+		self.poll_scheduler.report(dpid, max_utilization, max_change)
+
+		if self.recorder:
+			self._record_ports(dpid, body)
+
+	def _record_ports(self, dpid, body):
+		"""
+			Record the speed and free bandwidth of the ports in body.
+		"""
+		free_bandwidth = self.free_bandwidth[dpid]
+		port_nos = [stat.port_no for stat in body if stat.port_no != ofproto_v1_3.OFPP_LOCAL]
+		speeds = [self.port_speed[(dpid, port_no)][-1] for port_no in port_nos]
+		free_bws = [free_bandwidth.get(port_no) for port_no in port_nos]
+		free_bws = [float('nan') if bw is None else bw for bw in free_bws]
+		self.recorder.record_ports(time.time(), dpid, port_nos, speeds, free_bws)
 
 	@set_ev_cls(ofp_event.EventOFPPortDescStatsReply, MAIN_DISPATCHER)
 	def port_desc_stats_reply_handler(self, ev):
 		"""
 			Save port description info.
+			It is requested only once when the datapath connects.
 		"""
 		msg = ev.msg
 		dpid = msg.datapath.id
 		ofproto = msg.datapath.ofproto
+		port_features = self.port_features.setdefault(dpid, {})
+		for p in ev.msg.body:
+			# Recording data.
+			port_features[p.port_no] = self._get_port_feature(ofproto, p)
+			if p.port_no <= ofproto.OFPP_MAX:
+				self.capacity.set_curr_speed(dpid, p.port_no, p.curr_speed)
 
+	def _get_port_feature(self, ofproto, p):
+		"""
+			Get port_feature = (config, state, p.curr_speed) of port description p.
+		"""
 		config_dict = {ofproto.OFPPC_PORT_DOWN: "Down",
 					   ofproto.OFPPC_NO_RECV: "No Recv",
 					   ofproto.OFPPC_NO_FWD: "No Farward",
@@ -196,36 +385,23 @@ class NetworkMonitor(app_manager.RyuApp):
 					  ofproto.OFPPS_BLOCKED: "Blocked",
 					  ofproto.OFPPS_LIVE: "Live"}
 
-		ports = []
-		for p in ev.msg.body:
-			ports.append('port_no=%d hw_addr=%s name=%s config=0x%08x '
-						 'state=0x%08x curr=0x%08x advertised=0x%08x '
-						 'supported=0x%08x peer=0x%08x curr_speed=%d '
-						 'max_speed=%d' %
-						 (p.port_no, p.hw_addr,
-						  p.name, p.config,
-						  p.state, p.curr, p.advertised,
-						  p.supported, p.peer, p.curr_speed,
-						  p.max_speed))
-
-			if p.config in config_dict:
-				config = config_dict[p.config]
-			else:
-				config = "up"
-
-			if p.state in state_dict:
-				state = state_dict[p.state]
-			else:
-				state = "up"
+		if p.config in config_dict:
+			config = config_dict[p.config]
+		else:
+			config = "up"
 
-			# Recording data.
-			port_feature = (config, state, p.curr_speed)
-			self.port_features[dpid][p.port_no] = port_feature
+		if p.state in state_dict:
+			state = state_dict[p.state]
+		else:
+			state = "up"
+
+		return (config, state, p.curr_speed)
 
 	@set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
 	def _port_status_handler(self, ev):
 		"""
 			Handle the port status changed event.
+			Keep the cached port description of the port up to date.
 		"""
 		msg = ev.msg
 		ofproto = msg.datapath.ofproto
@@ -237,6 +413,17 @@ class NetworkMonitor(app_manager.RyuApp):
 					   ofproto.OFPPR_DELETE: "deleted",
 					   ofproto.OFPPR_MODIFY: "modified", }
 
+		port_features = self.port_features.setdefault(dpid, {})
+		if reason == ofproto.OFPPR_DELETE:
+			port_features.pop(port_no, None)
+			self.free_bandwidth.get(dpid, {}).pop(port_no, None)
+			self.capacity.remove(dpid, port_no)
+			self.port_rate.remove((dpid, port_no))
+		elif reason in reason_dict:
+			port_features[port_no] = self._get_port_feature(ofproto, msg.desc)
+			if port_no <= ofproto.OFPP_MAX:
+				self.capacity.set_curr_speed(dpid, port_no, msg.desc.curr_speed)
+
 		if reason in reason_dict:
 			print "switch%d: port %s %s" % (dpid, reason_dict[reason], port_no)
 		else:
@@ -249,94 +436,75 @@ class NetworkMonitor(app_manager.RyuApp):
 		self.logger.debug('send stats request: %016x', datapath.id)
 		ofproto = datapath.ofproto
 		parser = datapath.ofproto_parser
-		req = parser.OFPPortDescStatsRequest(datapath, 0)
-		datapath.send_msg(req)
 		req = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
 		datapath.send_msg(req)
-		req = parser.OFPFlowStatsRequest(datapath)
+		# Only the per-flow entries of SDIPMAN, selected by cookie class.
+		self.flow_request_time[datapath.id] = time.time()
+		req = parser.OFPFlowStatsRequest(
+			datapath, 0, flow_cookie.FLOW_TABLE_ID,
+			ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+			flow_cookie.make_cookie(flow_cookie.COOKIE_FLOW),
+			flow_cookie.CLASS_MASK, parser.OFPMatch())
 		datapath.send_msg(req)
 
-	def get_min_bw_of_links(self, graph, path, min_bw):
-		"""
-			Getting bandwidth of path. Actually, the mininum bandwidth
-			of links is the path's bandwith, because it is the bottleneck of path.
-		"""
-		_len = len(path)
-		if _len > 1:
-			minimal_band_width = min_bw
-			for i in xrange(_len-1):
-				pre, curr = path[i], path[i+1]
-				if 'bandwidth' in graph[pre][curr]:
-					bw = graph[pre][curr]['bandwidth']
-					minimal_band_width = min(bw, minimal_band_width)
-				else:
-					continue
-			return minimal_band_width
-		else:
-			return min_bw
-
 	def get_best_path_by_bw(self, graph, paths):
 		"""
 			Get best path by comparing paths.
 			Note: This function is called in EFattree module.
+			The path-to-link incidence is rebuilt only when a new
+			shortest_paths snapshot is given.
+			Path bandwidth is bounded by the largest port capacity, so that
+			fat links are not capped to the capacity of thin ones.
+		"""
+		if self.path_selector is None or self.path_selector.paths is not paths:
+			self.path_selector = BandwidthPathSelector(paths)
+		capabilities, best_paths = self.path_selector.select(graph, self.capacity.get_max())
+		return capabilities, best_paths
+
+	def get_widest_paths(self, graph):
+		"""
+			Get the widest path of every pair directly on the free bandwidth
+			graph, by one widest-path Dijkstra per source, without enumerating
+			the k shortest paths. Yield to other green threads between sources,
+			the graph is a frozen snapshot.
+			capabilities = {src:{dst:bandwidth,},}
+			best_paths = {src:{dst:[path],},}
 		"""
+		max_capacity = self.capacity.get_max()
 		capabilities = {}
-		best_paths = copy.deepcopy(paths)
-
-		for src in paths:
-			for dst in paths[src]:
-				if src == dst:
-					best_paths[src][src] = [src]
-					capabilities.setdefault(src, {src: setting.MAX_CAPACITY})
-					capabilities[src][src] = setting.MAX_CAPACITY
-				else:
-					max_bw_of_paths = 0
-					best_path = paths[src][dst][0]
-					for path in paths[src][dst]:
-						min_bw = setting.MAX_CAPACITY
-						min_bw = self.get_min_bw_of_links(graph, path, min_bw)
-						if min_bw > max_bw_of_paths:
-							max_bw_of_paths = min_bw
-							best_path = path
-					best_paths[src][dst] = best_path
-					capabilities.setdefault(src, {dst: max_bw_of_paths})
-					capabilities[src][dst] = max_bw_of_paths
-
-		# self.capabilities and self.best_paths have no actual utility in this module.
-		self.capabilities = capabilities
-		self.best_paths = best_paths
+		best_paths = {}
+		for src in graph.nodes():
+			capabilities[src], best_paths[src] = widest_paths_from(graph, src, max_capacity)
+			hub.sleep(0)
 		return capabilities, best_paths
 
 	def create_bw_graph(self, bw_dict):
 		"""
-			Save bandwidth data into networkx graph object.
+			Save bandwidth data into a new networkx graph object.
+			It is a copy of the topology snapshot of awareness, which is
+			never modified, with the free bandwidth of every link; it is
+			frozen too, with the same graph['version'].
 		"""
 		try:
-			graph = self.awareness.graph
+			graph = nx.DiGraph(self.awareness.graph)
 			link_to_port = self.awareness.link_to_port
-			for link in link_to_port:
-				(src_dpid, dst_dpid) = link
-				(src_port, dst_port) = link_to_port[link]
+			for src_dpid, dst_dpid in graph.edges():
+				ports = link_to_port.get((src_dpid, dst_dpid))
+				if ports is None:
+					continue
+				src_port = ports[0]
 				if src_dpid in bw_dict and dst_dpid in bw_dict:
-					bandwidth = bw_dict[src_dpid][src_port]
-					# Add key:value pair of bandwidth into graph.
-					if graph.has_edge(src_dpid, dst_dpid):
-						graph[src_dpid][dst_dpid]['bandwidth'] = bandwidth
-					else:
-						graph.add_edge(src_dpid, dst_dpid)
-						graph[src_dpid][dst_dpid]['bandwidth'] = bandwidth
+					bandwidth = bw_dict[src_dpid].get(src_port) or 0
 				else:
-					if graph.has_edge(src_dpid, dst_dpid):
-						graph[src_dpid][dst_dpid]['bandwidth'] = 0
-					else:
-						graph.add_edge(src_dpid, dst_dpid)
-						graph[src_dpid][dst_dpid]['bandwidth'] = 0
-			return graph
+					bandwidth = 0
+				# Add key:value pair of bandwidth into graph.
+				graph[src_dpid][dst_dpid]['bandwidth'] = bandwidth
+			return nx.freeze(graph)
 		except:
 			self.logger.info("Create bw graph exception")
 			if self.awareness is None:
 				self.awareness = lookup_service_brick('awareness')
-			return self.awareness.graph
+			return self.graph
 
 	def _save_freebandwidth(self, dpid, port_no, speed):
 		"""
@@ -345,45 +513,51 @@ class NetworkMonitor(app_manager.RyuApp):
 			self.port_features[dpid][p.port_no] = port_feature
 			self.free_bandwidth = {dpid:{port_no:free_bw,},}
 		"""
-		port_state = self.port_features.get(dpid).get(port_no)
+		port_state = self.port_features.get(dpid, {}).get(port_no)
 		if port_state:
-			capacity = 10000   # The true bandwidth of link, instead of 'curr_speed'.
+			capacity = self._get_port_capacity(dpid, port_no)
 			free_bw = self._get_free_bw(capacity, speed)
 			self.free_bandwidth[dpid].setdefault(port_no, None)
 			self.free_bandwidth[dpid][port_no] = free_bw
 		else:
 			self.logger.info("Port is Down")
 
+	def _get_port_capacity(self, dpid, port_no):
+		"""
+			Capacity of port in Kbit/s.
+			The capacity manifest of the topology gives the true bandwidth
+			of links, 'curr_speed' is used for the ports not in it.
+		"""
+		return self.capacity.get(dpid, port_no)
+
 	def _save_stats(self, _dict, key, value, length=5):
-		if key not in _dict:
-			_dict[key] = []
-		_dict[key].append(value)
-		if len(_dict[key]) > length:
-			_dict[key].pop(0)
-
-	def _get_speed(self, now, pre, period):
-		if period:
-			return (now - pre) / (period)
-		else:
-			return 0
+		"""
+			Append value to the ring buffer of key, return the buffer.
+			The buffer keeps the last `length` values.
+		"""
+		return save_sample(_dict, key, value, length)
 
 	def _get_free_bw(self, capacity, speed):
 		# freebw: Kbit/s
 		return max(capacity - speed * 8 / 1000.0, 0)
 
-	def _get_time(self, sec, nsec):
-		return sec + nsec / 1000000000.0
-
-	def _get_period(self, n_sec, n_nsec, p_sec, p_nsec):
-		return self._get_time(n_sec, n_nsec) - self._get_time(p_sec, p_nsec)
-
 	def show_stat(self, _type):
 		'''
 			Show statistics information according to data type.
 			_type: 'port' / 'flow'
+			Printed at most once every setting.TOSHOW_INTERVAL, the same
+			data is served by the REST API without printing.
 		'''
 		if setting.TOSHOW_stat is False:
 			return
+		if _type == 'flow' and not setting.TOSHOW_flow_stat:
+			return
+		if _type == 'port' and not setting.TOSHOW_port_stat:
+			return
+		now = time.time()
+		if now - self.show_time.get(_type, 0) < setting.TOSHOW_INTERVAL:
+			return
+		self.show_time[_type] = now
 
 		bodys = self.stats[_type]
 		if _type == 'flow' and setting.TOSHOW_flow_stat:
@@ -421,7 +595,7 @@ class NetworkMonitor(app_manager.RyuApp):
 							dpid, stat.port_no,
 							stat.rx_packets, stat.rx_bytes,
 							stat.tx_packets, stat.tx_bytes,
-							10000,
+							self._get_port_capacity(dpid, stat.port_no),
 							abs(self.port_speed[(dpid, stat.port_no)][-1] * 8),
 							self.free_bandwidth[dpid][stat.port_no],
 							self.port_features[dpid][stat.port_no][0],
@@ -0,0 +1,146 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import struct
+
+from ryu.lib.packet import ethernet
+from ryu.lib.packet import arp
+from ryu.lib.packet import ipv4
+from ryu.lib.packet import tcp
+from ryu.lib.packet import udp
+from ryu.lib.packet import vlan
+from ryu.lib.packet import ether_types
+from ryu.lib.packet import in_proto
+
+
+_UNPARSED = object()
+
+# 802.1Q and 802.1ad (QinQ) tags, which can be stacked.
+_VLAN_TAGS = {ether_types.ETH_TYPE_8021Q: vlan.vlan,
+			  ether_types.ETH_TYPE_8021AD: vlan.svlan}
+
+
+class PacketInView(object):
+	"""
+		Lazily decoded view of a packet_in payload.
+		Headers are decoded only as deep as they are asked for
+		(eth [-> VLAN tags] -> ARP / IPv4 -> TCP / UDP), and each layer
+		is decoded once.
+	"""
+
+	def __init__(self, data):
+		self.data = data
+		self._eth = _UNPARSED
+		self._eth_payload = None   # Behind the VLAN tags.
+		self._ethertype = None
+		self._vlans = []
+		self._arp = _UNPARSED
+		self._ipv4 = _UNPARSED
+		self._ipv4_payload = None
+		self._tcp = _UNPARSED
+		self._udp = _UNPARSED
+
+	@staticmethod
+	def _parse(cls, buf):
+		"""
+			Decode one header, return (header, payload).
+			Truncated or malformed headers are treated as absent.
+		"""
+		if not buf:
+			return None, None
+		try:
+			header, _, payload = cls.parser(buf)
+		except (struct.error, ValueError, TypeError):
+			return None, None
+		return header, payload
+
+	@property
+	def eth(self):
+		if self._eth is _UNPARSED:
+			self._eth, payload = self._parse(ethernet.ethernet, self.data)
+			if self._eth is not None:
+				ethertype = self._eth.ethertype
+				while ethertype in _VLAN_TAGS:
+					tag, payload = self._parse(_VLAN_TAGS[ethertype], payload)
+					if tag is None:
+						ethertype = None
+						break
+					self._vlans.append(tag)
+					ethertype = tag.ethertype
+				self._ethertype = ethertype
+			self._eth_payload = payload
+		return self._eth
+
+	@property
+	def ethertype(self):
+		"""
+			Ethertype of the payload behind the VLAN tags, like the
+			eth_type match field of OpenFlow 1.3.
+		"""
+		self.eth
+		return self._ethertype
+
+	@property
+	def vlans(self):
+		self.eth
+		return self._vlans
+
+	@property
+	def arp(self):
+		if self._arp is _UNPARSED:
+			self._arp = None
+			if self.ethertype == ether_types.ETH_TYPE_ARP:
+				self._arp = self._parse(arp.arp, self._eth_payload)[0]
+		return self._arp
+
+	@property
+	def ipv4(self):
+		if self._ipv4 is _UNPARSED:
+			self._ipv4 = None
+			if self.ethertype == ether_types.ETH_TYPE_IP:
+				self._ipv4, self._ipv4_payload = self._parse(ipv4.ipv4, self._eth_payload)
+		return self._ipv4
+
+	@property
+	def tcp(self):
+		if self._tcp is _UNPARSED:
+			self._tcp = None
+			ip_pkt = self.ipv4
+			if ip_pkt is not None and ip_pkt.proto == in_proto.IPPROTO_TCP:
+				self._tcp = self._parse(tcp.tcp, self._ipv4_payload)[0]
+		return self._tcp
+
+	@property
+	def udp(self):
+		if self._udp is _UNPARSED:
+			self._udp = None
+			ip_pkt = self.ipv4
+			if ip_pkt is not None and ip_pkt.proto == in_proto.IPPROTO_UDP:
+				self._udp = self._parse(udp.udp, self._ipv4_payload)[0]
+		return self._udp
+
+
+def get_packet_view(msg):
+	"""
+		Get the shared decoded view of a packet_in message.
+		Every Ryu app receives the same message object, so the view is
+		cached on it and the payload is decoded once for all of them.
+	"""
+	view = getattr(msg, '_packet_view', None)
+	if view is None:
+		view = PacketInView(msg.data)
+		msg._packet_view = view
+	return view
@@ -0,0 +1,256 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import networkx as nx
+
+from path_store import PathStore, PathRow, PathTable
+
+
+def k_shortest_paths(graph, src, dst, weight='weight', k=5):
+	"""
+		Creat K shortest paths from src to dst.
+		generator produces lists of simple paths, in order from shortest to longest.
+		Return None if there is no path between src and dst.
+	"""
+	generator = nx.shortest_simple_paths(graph, source=src, target=dst, weight=weight)
+	shortest_paths = []
+	try:
+		for path in generator:
+			if k <= 0:
+				break
+			shortest_paths.append(path)
+			k -= 1
+		return shortest_paths
+	except (nx.NetworkXNoPath, nx.NodeNotFound):
+		return None
+
+
+def k_shortest_paths_from(graph, src, dsts, weight='weight', k=5):
+	"""
+		Creat K shortest paths from src to every dst in dsts.
+		The pair (src, src) has the single path [src].
+		result = {dst:[[path],],}
+	"""
+	result = {}
+	for dst in dsts:
+		if dst == src:
+			result[dst] = [[src]]
+		else:
+			result[dst] = k_shortest_paths(graph, src, dst, weight=weight, k=k)
+	return result
+
+
+def k_shortest_paths_task(task):
+	"""
+		Entry of path computation in a worker process.
+		task = (graph, [(src, dsts),], weight, k)
+		Return {src:{dst:[[path],],},}
+	"""
+	graph, jobs, weight, k = task
+	return dict((src, k_shortest_paths_from(graph, src, dsts, weight=weight, k=k))
+				for src, dsts in jobs)
+
+
+def make_tasks(graph, jobs, weight='weight', k=5, n_tasks=1):
+	"""
+		Spread the source nodes of jobs over n_tasks worker tasks,
+		balanced by the number of pairs of each task.
+		The graph is shipped as a whole, so that equal-cost paths come
+		out in the same order as in the controller process.
+		jobs = {src:set(dst,),}
+	"""
+	# Tasks are pickled by a pool thread later on, so the graph must not
+	# be modified meanwhile: take a private copy unless it is frozen.
+	if not nx.is_frozen(graph):
+		graph = graph.copy()
+	buckets = [[] for i in xrange(max(n_tasks, 1))]
+	loads = [0] * len(buckets)
+	for src in sorted(jobs, key=lambda src: len(jobs[src]), reverse=True):
+		i = loads.index(min(loads))
+		buckets[i].append((src, list(jobs[src])))
+		loads[i] += len(jobs[src])
+	return [(graph, bucket, weight, k) for bucket in buckets if bucket]
+
+
+class KShortestPathEngine(object):
+	"""
+		Incremental all-pairs K shortest paths.
+		The engine remembers the graph it has computed paths for. On update,
+		only (src, dst) pairs whose K paths may be affected are recomputed:
+		- a removed (or heavier) edge affects the pairs whose paths use it;
+		- an added (or lighter) edge (u, v) affects (src, dst) only if
+		  dist(src, u) + w(u, v) + dist(v, dst) is not longer than the
+		  current K-th path of that pair.
+		An unchanged graph is not recomputed at all.
+		paths is a PathTable, read like {src:{dst:[(path),],},}; the paths
+		are interned in self.store.
+		pause() is called between the sources of the long loops, e.g. to
+		yield to other green threads.
+	"""
+
+	def __init__(self, k=5, weight='weight', pause=None):
+		self.k = k
+		self.weight = weight
+		self.pause = pause or (lambda: None)
+		self.version = 0           # Bumped whenever self.paths changes.
+		self.store = PathStore()
+		self.paths = PathTable(self.store, {})
+		self._nodes = set()
+		self._edges = {}           # {(src,dst):weight,}
+		self._edge_pairs = {}      # {(u,v):set((src,dst),),}
+		self._kth_length = {}      # {(src,dst):length of the K-th path,}
+
+	def _edge_weights(self, graph):
+		weight = self.weight
+		return dict(((u, v), d.get(weight, 1)) for u, v, d in graph.edges(data=True))
+
+	def _path_length(self, path):
+		return sum(self._edges[(path[i], path[i+1])] for i in xrange(len(path) - 1))
+
+	def get_dirty_pairs(self, graph, nodes, edges):
+		"""
+			Get the pairs whose K shortest paths may have changed.
+		"""
+		added = [e for e in edges if e[0] != e[1] and
+				 (e not in self._edges or edges[e] < self._edges[e])]
+		removed = [e for e in self._edges if e not in edges or edges[e] > self._edges[e]]
+
+		dirty = set()
+		for e in removed:
+			dirty.update(self._edge_pairs.get(e, ()))
+		for src in nodes - self._nodes:
+			for dst in nodes:
+				dirty.add((src, dst))
+				dirty.add((dst, src))
+
+		if added:
+			dist = {}
+			for src in nodes:
+				dist[src] = nx.single_source_dijkstra_path_length(graph, src, weight=self.weight)
+				self.pause()
+			for (u, v) in added:
+				w = edges[(u, v)]
+				dist_from_v = dist[v]
+				for src in nodes:
+					if u not in dist[src]:
+						continue
+					base = dist[src][u] + w
+					for dst, d in dist_from_v.items():
+						if src == dst:
+							continue
+						bound = self._kth_length.get((src, dst))
+						if bound is None or base + d <= bound:
+							dirty.add((src, dst))
+				self.pause()
+
+		return set((src, dst) for (src, dst) in dirty if src in nodes and dst in nodes)
+
+	def plan(self, graph):
+		"""
+			Take graph as the new reference graph and find the work to do.
+			Return None if nothing changed, else (jobs, removed_nodes).
+			jobs = {src:set(dst,),}
+			The caller computes the jobs and hands the results to apply().
+		"""
+		nodes = set(graph.nodes())
+		edges = self._edge_weights(graph)
+		if nodes == self._nodes and edges == self._edges:
+			return None
+
+		dirty = self.get_dirty_pairs(graph, nodes, edges)
+		removed_nodes = self._nodes - nodes
+		self._nodes = nodes
+		self._edges = edges
+
+		jobs = {}
+		for (src, dst) in dirty:
+			jobs.setdefault(src, set()).add(dst)
+		return jobs, removed_nodes
+
+	def update(self, graph):
+		"""
+			Bring self.paths up to date with graph in the calling thread.
+			Return True if self.paths has been replaced by a new snapshot.
+		"""
+		plan = self.plan(graph)
+		if plan is None:
+			return False
+		jobs, removed_nodes = plan
+		results = {}
+		for src, dsts in jobs.items():
+			results[src] = k_shortest_paths_from(graph, src, dsts, weight=self.weight, k=self.k)
+			self.pause()
+		self.apply(results, removed_nodes)
+		return True
+
+	def apply(self, results, removed_nodes=()):
+		"""
+			Build a new paths snapshot from the recomputed pairs.
+			Sources that are not touched share their row with the
+			previous snapshot, which is never mutated.
+			results = {src:{dst:[[path],],},}
+		"""
+		store = self.store
+		rows = dict((src, row) for src, row in self.paths.items()
+					if src not in removed_nodes)
+		changed = {}   # {src:{dst:[path_id,],},}
+		for src, row in rows.items():
+			if any(dst in removed_nodes for dst in row):
+				pair_ids = row.get_pair_ids()
+				for dst in removed_nodes:
+					if dst in pair_ids:
+						self._forget_pair(src, dst)
+						store.release(pair_ids.pop(dst))
+				changed[src] = pair_ids
+		for src in removed_nodes:
+			row = self.paths.get(src)
+			for dst in (row or ()):
+				self._forget_pair(src, dst)
+				store.release(row.path_ids(dst).tolist())
+
+		for src, dsts in results.items():
+			pair_ids = changed.get(src)
+			if pair_ids is None:
+				pair_ids = rows[src].get_pair_ids() if src in rows else {}
+			for dst, k_paths in dsts.items():
+				self._forget_pair(src, dst)
+				store.release(pair_ids.pop(dst, ()))
+				if k_paths:
+					pair_ids[dst] = [store.intern(path) for path in k_paths]
+					self._remember_pair(src, dst, k_paths)
+				# Else there is no path between src and dst.
+			changed[src] = pair_ids
+
+		for src, pair_ids in changed.items():
+			rows[src] = PathRow(store, pair_ids)
+		self.paths = PathTable(store, rows)
+		store.commit(self.paths)
+		self.version += 1
+
+	def _remember_pair(self, src, dst, k_paths):
+		for path in k_paths:
+			for i in xrange(len(path) - 1):
+				self._edge_pairs.setdefault((path[i], path[i+1]), set()).add((src, dst))
+		if len(k_paths) >= self.k and src != dst:
+			self._kth_length[(src, dst)] = self._path_length(k_paths[-1])
+
+	def _forget_pair(self, src, dst):
+		for path in self.paths.get(src, {}).get(dst) or ():
+			for i in xrange(len(path) - 1):
+				pairs = self._edge_pairs.get((path[i], path[i+1]))
+				if pairs:
+					pairs.discard((src, dst))
+		self._kth_length.pop((src, dst), None)
@@ -0,0 +1,67 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import math
+import struct
+
+
+def hash_unit(*keys):
+	"""
+		Hash keys to a float in (0, 1).
+		Unlike hash(), it is the same in every process and every run.
+	"""
+	digest = hashlib.md5(repr(keys).encode('utf-8')).digest()
+	value = struct.unpack('>Q', digest[:8])[0] >> 11   # 53 bits, exact in a float.
+	return (value + 0.5) / float(1 << 53)
+
+
+def get_path_bw(graph, path, max_capacity):
+	"""
+		Bottleneck free bandwidth of path on the bandwidth graph.
+		Links without bandwidth data do not limit the path, links missing
+		from the graph make it unusable.
+	"""
+	bw = max_capacity
+	for i in xrange(len(path) - 1):
+		if not graph.has_edge(path[i], path[i+1]):
+			return 0
+		bw = min(bw, graph[path[i]][path[i+1]].get('bandwidth', max_capacity))
+	return max(bw, 0)
+
+
+def pick_path(flow, paths, weights):
+	"""
+		Pick one of paths for flow by weighted rendezvous hashing: the path
+		with the highest -weight / ln(hash(flow, path)) wins. A path gets
+		the flows in proportion to its weight, and a flow moves only when
+		its own winner changes: when weights shift, just the share of flows
+		needed to follow them is remapped, and a path that comes or goes
+		takes or gives away only its own flows.
+		Paths of weight 0 are skipped, unless all of them are.
+		Return None if paths is empty.
+	"""
+	best = None
+	best_score = None
+	for path, weight in zip(paths, weights):
+		if weight <= 0:
+			continue
+		score = -weight / math.log(hash_unit(flow, tuple(path)))
+		if best_score is None or score > best_score:
+			best, best_score = path, score
+	if best is None and paths:
+		best = max(paths, key=lambda path: hash_unit(flow, tuple(path)))
+	return best
@@ -0,0 +1,69 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import sys
+
+from eventlet.green import subprocess
+from ryu.lib import hub
+
+from path_worker import read_msg, write_msg
+
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'path_worker.py')
+
+
+class PathPool(object):
+	"""
+		Worker processes computing K shortest paths.
+		Unlike a multiprocessing.Pool forked from the controller, the
+		workers are new programs started with close_fds, so they inherit
+		neither the OpenFlow sockets nor the hub, and they are talked to
+		through green pipes: waiting for a result only suspends the
+		calling green thread, never the event loop.
+	"""
+
+	def __init__(self, size):
+		self.procs = [subprocess.Popen([sys.executable, WORKER],
+									   stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+									   close_fds=True)
+					  for i in xrange(size)]
+
+	def __len__(self):
+		return len(self.procs)
+
+	def _run(self, proc, task):
+		write_msg(proc.stdin, task)
+		return read_msg(proc.stdout)
+
+	def map(self, tasks):
+		"""
+			Run at most len(self) tasks, one per worker, and return their
+			results in order. Raise an exception if a worker fails, the
+			pool must be closed then.
+		"""
+		threads = [hub.spawn(self._run, proc, task, raise_error=True)
+				   for proc, task in zip(self.procs, tasks)]
+		return [thread.wait() for thread in threads]
+
+	def close(self):
+		for proc in self.procs:
+			try:
+				proc.stdin.close()
+				proc.kill()
+			except (IOError, OSError):
+				pass
+		self.procs = []
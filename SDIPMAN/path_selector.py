@@ -0,0 +1,120 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+
+class BandwidthPathSelector(object):
+	"""
+		Path-to-link incidence of all candidate paths of a shortest_paths
+		snapshot, so that the bottleneck bandwidth of every path and the
+		best path of every pair are computed with a few array operations.
+		It is built once per snapshot and reused every monitor period.
+		- link_ids = {(src_dpid,dst_dpid):link_id,}
+		- incidence[path_id] = [link_id,], padded with a sentinel link
+		- pair_paths[pair_id] = [path_id,], padded with a sentinel path
+	"""
+
+	def __init__(self, paths):
+		self.paths = paths     # The snapshot this selector is built for.
+		self.link_ids = {}
+		self.pairs = []        # [(src, dst),]
+		self.self_pairs = []   # [src,]
+		self.path_list = []    # [path,]
+
+		pair_path_ids = []
+		for src in paths:
+			for dst in paths[src]:
+				if src == dst:
+					self.self_pairs.append(src)
+					continue
+				candidates = paths[src][dst]
+				if not candidates:
+					continue
+				ids = []
+				for path in candidates:
+					ids.append(len(self.path_list))
+					self.path_list.append(path)
+				self.pairs.append((src, dst))
+				pair_path_ids.append(ids)
+
+		for path in self.path_list:
+			for i in xrange(len(path) - 1):
+				self.link_ids.setdefault((path[i], path[i+1]), len(self.link_ids))
+		self.links = sorted(self.link_ids, key=self.link_ids.get)
+
+		n_links = len(self.link_ids)
+		n_paths = len(self.path_list)
+		max_hops = max([len(path) - 1 for path in self.path_list] or [1])
+		self.incidence = np.full((n_paths, max(max_hops, 1)), n_links, dtype=np.int32)
+		for path_id, path in enumerate(self.path_list):
+			for i in xrange(len(path) - 1):
+				self.incidence[path_id, i] = self.link_ids[(path[i], path[i+1])]
+
+		k = max([len(ids) for ids in pair_path_ids] or [1])
+		self.pair_paths = np.full((len(self.pairs), k), n_paths, dtype=np.int32)
+		for pair_id, ids in enumerate(pair_path_ids):
+			self.pair_paths[pair_id, :len(ids)] = ids
+
+	def get_link_bw(self, graph, default):
+		"""
+			Bandwidth of every link, indexed by link id.
+			Links without bandwidth data do not limit the path: they keep
+			the default, the largest bandwidth a path can have.
+		"""
+		link_bw = np.full(len(self.links) + 1, default, dtype=np.float64)
+		for link_id, (src, dst) in enumerate(self.links):
+			if graph.has_edge(src, dst):
+				bw = graph[src][dst].get('bandwidth')
+				if bw is not None:
+					link_bw[link_id] = bw
+		return link_bw
+
+	def get_path_bw(self, graph, max_capacity):
+		"""
+			Bottleneck bandwidth of every path, indexed by path id.
+		"""
+		link_bw = self.get_link_bw(graph, max_capacity)
+		if not len(self.path_list):
+			return np.zeros(0)
+		return np.minimum(link_bw[self.incidence].min(axis=1), max_capacity)
+
+	def select(self, graph, max_capacity):
+		"""
+			Get the widest candidate path of every pair.
+			capabilities = {src:{dst:bandwidth,},}
+			best_paths = {src:{dst:[path],},}
+		"""
+		capabilities = {}
+		best_paths = {}
+		for src in self.self_pairs:
+			capabilities.setdefault(src, {})[src] = max_capacity
+			best_paths.setdefault(src, {})[src] = [src]
+
+		if self.pairs:
+			# The sentinel path has negative bandwidth and never wins.
+			path_bw = np.append(self.get_path_bw(graph, max_capacity), -1.0)
+			candidates_bw = path_bw[self.pair_paths]
+			best = candidates_bw.argmax(axis=1)
+			rows = np.arange(len(self.pairs))
+			best_bw = np.maximum(candidates_bw[rows, best], 0).tolist()
+			best_ids = self.pair_paths[rows, best].tolist()
+			path_list = self.path_list
+			for (src, dst), bw, path_id in zip(self.pairs, best_bw, best_ids):
+				capabilities.setdefault(src, {})[dst] = bw
+				best_paths.setdefault(src, {})[dst] = path_list[path_id]
+
+		return capabilities, best_paths
@@ -0,0 +1,187 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import weakref
+
+import numpy as np
+
+
+class PathStore(object):
+	"""
+		Interned paths: every distinct path is kept once, as a tuple, under
+		an integer path id, with a count of the pairs using it.
+		Ids whose count drops to zero are reused, but only once no table
+		that could still refer to them is alive, so a snapshot held by a
+		reader never sees its paths change.
+	"""
+
+	def __init__(self):
+		self.paths = []   # [path,], indexed by path_id, None if free.
+		self.ids = {}   # {path:path_id,}
+		self.refs = []   # [number of pairs using the path,]
+		self.free = []   # [path_id,]
+		self.version = 0
+		self._released = set()   # {path_id,}, released since the last commit.
+		self._retired = {}   # {path_id:last version using it,}
+		self._tables = []   # [(version, weakref to PathTable),]
+
+	def __len__(self):
+		return len(self.ids)
+
+	def intern(self, path):
+		path = tuple(path)
+		path_id = self.ids.get(path)
+		if path_id is None:
+			if self.free:
+				path_id = self.free.pop()
+				self.paths[path_id] = path
+				self.refs[path_id] = 0
+			else:
+				path_id = len(self.paths)
+				self.paths.append(path)
+				self.refs.append(0)
+			self.ids[path] = path_id
+		self.refs[path_id] += 1
+		return path_id
+
+	def release(self, path_ids):
+		for path_id in path_ids:
+			if path_id < 0:
+				continue
+			self.refs[path_id] -= 1
+			if self.refs[path_id] == 0:
+				self._released.add(path_id)
+
+	def get(self, path_id):
+		return self.paths[path_id]
+
+	def commit(self, table):
+		"""
+			Register a new table, and free the ids which no live table uses.
+			The ids released since the last commit were in use up to the
+			previous version.
+		"""
+		for path_id in self._released:
+			self._retired[path_id] = self.version
+		self._released = set()
+		self.version += 1
+		table.version = self.version
+		self._tables = [(version, ref) for version, ref in self._tables if ref() is not None]
+		self._tables.append((self.version, weakref.ref(table)))
+		oldest = min(version for version, ref in self._tables)
+		for path_id, version in list(self._retired.items()):
+			if version >= oldest:
+				continue
+			del self._retired[path_id]
+			# Unless it has been interned again meanwhile.
+			if self.refs[path_id] == 0:
+				del self.ids[self.paths[path_id]]
+				self.paths[path_id] = None
+				self.free.append(path_id)
+
+
+class PathRow(object):
+	"""
+		Paths from one source: a (dst, path id) array, padded with -1.
+		Read like {dst:[path,],}.
+	"""
+	__slots__ = ('store', 'index', 'ids')
+
+	def __init__(self, store, pair_ids):
+		"""
+			pair_ids = {dst:[path_id,],}
+		"""
+		self.store = store
+		self.index = {}   # {dst:row,}
+		k = max([len(ids) for ids in pair_ids.values()] or [1])
+		self.ids = np.full((len(pair_ids), k), -1, dtype=np.int32)
+		for row, (dst, ids) in enumerate(pair_ids.items()):
+			self.index[dst] = row
+			self.ids[row, :len(ids)] = ids
+
+	def path_ids(self, dst):
+		row = self.ids[self.index[dst]]
+		return row[row >= 0]
+
+	def get_pair_ids(self):
+		return dict((dst, self.path_ids(dst).tolist()) for dst in self.index)
+
+	def get(self, dst, default=None):
+		if dst not in self.index:
+			return default
+		paths = self.store.paths
+		return [paths[path_id] for path_id in self.path_ids(dst)]
+
+	def __getitem__(self, dst):
+		paths = self.get(dst)
+		if paths is None:
+			raise KeyError(dst)
+		return paths
+
+	def __contains__(self, dst):
+		return dst in self.index
+
+	def __iter__(self):
+		return iter(self.index)
+
+	def __len__(self):
+		return len(self.index)
+
+	def keys(self):
+		return list(self.index)
+
+	def items(self):
+		return [(dst, self.get(dst)) for dst in self.index]
+
+
+class PathTable(object):
+	"""
+		Immutable snapshot of the k paths of all pairs, on a PathStore.
+		Read like shortest_paths = {src:{dst:[path,],},}, paths are tuples.
+		A new snapshot shares the rows of its unchanged sources with the
+		previous one, so snapshotting costs only the changed rows.
+	"""
+	__slots__ = ('store', 'rows', 'version', '__weakref__')
+
+	def __init__(self, store, rows):
+		self.store = store
+		self.rows = rows   # {src:PathRow,}
+		self.version = 0
+
+	def get(self, src, default=None):
+		return self.rows.get(src, default)
+
+	def __getitem__(self, src):
+		return self.rows[src]
+
+	def __contains__(self, src):
+		return src in self.rows
+
+	def __iter__(self):
+		return iter(self.rows)
+
+	def __len__(self):
+		return len(self.rows)
+
+	def keys(self):
+		return list(self.rows)
+
+	def items(self):
+		return list(self.rows.items())
+
+	def to_dict(self):
+		return dict((src, dict((dst, [list(path) for path in paths]) for dst, paths in row.items()))
+					for src, row in self.rows.items())
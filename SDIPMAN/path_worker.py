@@ -0,0 +1,73 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+	Worker program computing K shortest paths for the controller.
+	It reads tasks of path_engine.k_shortest_paths_task() from stdin and
+	writes their results to stdout, one length-prefixed pickle each,
+	until stdin is closed. See path_pool.PathPool.
+"""
+
+import struct
+import sys
+
+try:
+	import cPickle as pickle
+except ImportError:
+	import pickle
+
+from path_engine import k_shortest_paths_task
+
+
+HEADER = struct.Struct('>Q')
+
+
+def write_msg(f, obj):
+	data = pickle.dumps(obj, 2)
+	f.write(HEADER.pack(len(data)))
+	f.write(data)
+	f.flush()
+
+
+def _read_exactly(f, size):
+	chunks = []
+	while size > 0:
+		chunk = f.read(size)
+		if not chunk:
+			raise EOFError()
+		chunks.append(chunk)
+		size -= len(chunk)
+	return b''.join(chunks)
+
+
+def read_msg(f):
+	size = HEADER.unpack(_read_exactly(f, HEADER.size))[0]
+	return pickle.loads(_read_exactly(f, size))
+
+
+def main():
+	stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+	stdout = getattr(sys.stdout, 'buffer', sys.stdout)
+	while True:
+		try:
+			task = read_msg(stdin)
+		except EOFError:
+			return
+		write_msg(stdout, k_shortest_paths_task(task))
+
+
+if __name__ == '__main__':
+	main()
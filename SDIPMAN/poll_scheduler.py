@@ -0,0 +1,85 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Fractional part of the golden ratio, spreads start offsets evenly.
+_GOLDEN = 0.6180339887498949
+
+
+class PollScheduler(object):
+	"""
+		Adaptive per-datapath stats polling schedule.
+		A datapath whose ports are near capacity, or whose utilization
+		changes quickly, is polled more often (down to min_interval); an
+		idle one backs off (up to max_interval). Datapaths start at
+		staggered offsets, so that their replies do not arrive together.
+		Utilization and change are fractions of the port capacity.
+	"""
+
+	def __init__(self, base_interval, min_interval, max_interval,
+				 high_utilization=0.8, fast_change=0.1):
+		self.base_interval = base_interval
+		self.min_interval = min_interval
+		self.max_interval = max_interval
+		self.high_utilization = high_utilization
+		self.fast_change = fast_change
+		self.intervals = {}   # {dpid:seconds,}
+		self.next_poll = {}   # {dpid:time,}
+		self._slot = 0
+
+	def add(self, dpid, now):
+		if dpid in self.intervals:
+			return
+		self.intervals[dpid] = self.base_interval
+		self.next_poll[dpid] = now + (self._slot * _GOLDEN % 1.0) * self.base_interval
+		self._slot += 1
+
+	def remove(self, dpid):
+		self.intervals.pop(dpid, None)
+		self.next_poll.pop(dpid, None)
+
+	def due(self, now):
+		"""
+			Get the datapaths to poll now, and schedule their next poll.
+		"""
+		dpids = [dpid for dpid, t in self.next_poll.items() if t <= now]
+		for dpid in dpids:
+			next_poll = self.next_poll[dpid] + self.intervals[dpid]
+			# Keep the phase of the datapath, unless it has fallen behind.
+			self.next_poll[dpid] = next_poll if next_poll > now else now + self.intervals[dpid]
+		return dpids
+
+	def report(self, dpid, utilization, change):
+		"""
+			Adapt the interval of dpid to its latest port utilization.
+			utilization, change: the maxima over the ports of dpid.
+		"""
+		interval = self.intervals.get(dpid)
+		if interval is None:
+			return
+		if utilization >= self.high_utilization or change >= self.fast_change:
+			interval = max(self.min_interval, interval / 2.0)
+		else:
+			interval = min(self.max_interval, interval * 1.5)
+		if interval < self.intervals[dpid]:
+			# Do not wait for the old, longer interval to pass.
+			self.next_poll[dpid] -= self.intervals[dpid] - interval
+		self.intervals[dpid] = interval
+
+	def get_rates(self):
+		"""
+			Effective polling rate of every datapath, in polls per second.
+		"""
+		return dict((dpid, 1.0 / interval) for dpid, interval in self.intervals.items())
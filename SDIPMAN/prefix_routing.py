@@ -0,0 +1,93 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import socket
+import struct
+
+
+def get_prefix(ip, prefix_len):
+	"""
+		Get (network, netmask) of ip, e.g. ('10.1.0.0', '255.255.0.0').
+	"""
+	mask = (0xffffffff << (32 - prefix_len)) & 0xffffffff
+	addr = struct.unpack('!I', socket.inet_aton(ip))[0]
+	return (socket.inet_ntoa(struct.pack('!I', addr & mask)),
+			socket.inet_ntoa(struct.pack('!I', mask)))
+
+
+class PrefixRoute(object):
+	"""
+		Destination tree of one prefix.
+		Every switch in the tree forwards the prefix to its next hop, and
+		all branches end at dst_sw, whose own entries are proactive.
+		next_hops = {dpid:next_dpid,}
+		sources = set(dpid,), the switches entered from per-flow first hops.
+	"""
+
+	def __init__(self, prefix, dst_sw):
+		self.prefix = prefix
+		self.dst_sw = dst_sw
+		self.next_hops = {}
+		self.sources = set()
+
+	def extend(self, path):
+		"""
+			Graft path (which ends at dst_sw) onto the tree.
+			The walk stops at the first switch already in the tree, so the
+			tree stays loop-free. Return the switches newly added, from
+			the one nearest to dst_sw backwards.
+		"""
+		added = []
+		if not path or path[-1] != self.dst_sw:
+			return added
+		self.sources.add(path[0])
+		for i in xrange(len(path) - 1):
+			if path[i] in self.next_hops:
+				break
+			self.next_hops[path[i]] = path[i+1]
+			added.append(path[i])
+		added.reverse()
+		return added
+
+	def rebuild(self, best_paths):
+		"""
+			Rebuild the tree from self.sources along the current best paths.
+			A source without a best path keeps its branch of the old tree.
+			Return (changed, removed): the switches whose next hop is new or
+			different, ordered from dst_sw outwards, and the switches that
+			have left the tree.
+		"""
+		old = self.next_hops
+		self.next_hops = {}
+		for src in sorted(self.sources):
+			path = best_paths.get(src, {}).get(self.dst_sw)
+			if not path:
+				path = self._walk(old, src)
+			self.extend(path)
+
+		depth = {}
+		for node in self.next_hops:
+			depth[node] = len(self._walk(self.next_hops, node))
+		changed = sorted([node for node in self.next_hops if old.get(node) != self.next_hops[node]],
+						 key=lambda node: depth[node])
+		removed = [node for node in old if node not in self.next_hops]
+		return changed, removed
+
+	def _walk(self, next_hops, src):
+		path = [src]
+		while path[-1] in next_hops and len(path) <= len(next_hops):
+			path.append(next_hops[path[-1]])
+		return path
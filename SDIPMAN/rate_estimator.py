@@ -0,0 +1,130 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import deque
+
+
+class _RateState(object):
+	__slots__ = ('count', 'time', 'rate', 'trend', 'window', 'held')
+
+	def __init__(self, count, time, window):
+		self.count = count
+		self.time = time
+		self.rate = None
+		self.trend = 0.0
+		self.window = deque(maxlen=window)
+		self.held = 0
+
+
+class RateEstimator(object):
+	"""
+		Smoothed rates of byte counters, one per key.
+		update() takes the counter and the time it was read at (e.g. the
+		duration of the port or flow entry), and returns the smoothed rate:
+		mode 'ewma': exponentially weighted moving average with factor alpha;
+		mode 'window': mean of the last `window` rates.
+		A counter that goes backwards (entry re-installed, switch restarted)
+		starts over instead of giving a negative rate. A rate farther than
+		outlier_factor times the current rate (and than outlier_floor) is
+		held back for up to outlier_hold samples; if it persists, it is
+		taken as a real change. With trend_beta > 0, the trend of the
+		rate is tracked too (Holt's linear method), and predict() gives the
+		rate a short horizon ahead.
+	"""
+
+	def __init__(self, mode='ewma', alpha=0.5, window=3, outlier_factor=3.0,
+				 outlier_hold=1, outlier_floor=0, trend_beta=0):
+		if mode not in ('ewma', 'window'):
+			raise ValueError("Unknown rate estimator mode: %s" % mode)
+		self.mode = mode
+		self.alpha = alpha
+		self.window = window
+		self.outlier_factor = outlier_factor
+		self.outlier_hold = outlier_hold
+		self.outlier_floor = outlier_floor
+		self.trend_beta = trend_beta
+		self.states = {}   # {key:_RateState,}
+
+	def update(self, key, count, time):
+		state = self.states.get(key)
+		if state is None:
+			state = self.states[key] = _RateState(count, time, self.window)
+			# The counter has been accumulating for `time` seconds.
+			if time > 0:
+				self._accept(state, count / float(time), None)
+			return self.get(key)
+
+		period = time - state.time
+		if count < state.count or period < 0:
+			# Counter reset, keep the smoothed rate and start over.
+			state.count, state.time = count, time
+			state.held = 0
+			return self.get(key)
+		if period == 0:
+			return self.get(key)
+
+		raw = (count - state.count) / float(period)
+		state.count, state.time = count, time
+		if self._is_outlier(state, raw):
+			state.held += 1
+			return self.get(key)
+		state.held = 0
+		self._accept(state, raw, period)
+		return self.get(key)
+
+	def _is_outlier(self, state, raw):
+		if state.rate is None or state.held >= self.outlier_hold:
+			return False
+		deviation = abs(raw - state.rate)
+		return deviation > self.outlier_floor and \
+			deviation > self.outlier_factor * state.rate
+
+	def _accept(self, state, raw, period):
+		pre = state.rate
+		if self.mode == 'ewma':
+			if pre is None:
+				state.rate = raw
+			else:
+				state.rate = self.alpha * raw + (1 - self.alpha) * pre
+		else:
+			state.window.append(raw)
+			state.rate = sum(state.window) / float(len(state.window))
+		if self.trend_beta and pre is not None and period:
+			slope = (state.rate - pre) / period
+			state.trend = self.trend_beta * slope + (1 - self.trend_beta) * state.trend
+
+	def get(self, key):
+		state = self.states.get(key)
+		if state is None or state.rate is None:
+			return 0
+		return state.rate
+
+	def predict(self, key, horizon):
+		"""
+			Rate expected `horizon` seconds ahead, never negative.
+			Without trend tracking, it is the current smoothed rate.
+		"""
+		state = self.states.get(key)
+		if state is None or state.rate is None:
+			return 0
+		return max(state.rate + state.trend * horizon, 0)
+
+	def remove(self, key):
+		self.states.pop(key, None)
+
+	def remove_if(self, func):
+		for key in [key for key in self.states if func(key)]:
+			del self.states[key]
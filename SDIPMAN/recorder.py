@@ -0,0 +1,223 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+	Binary time-series recorder of what the controller observed.
+	Every table is a set of column files <table>.<column>.bin in the record
+	directory, memory-mapped and grown in chunks, and a <table>.json
+	file with the schema and the number of rows written so far.
+	Chosen paths are stored by id, the ids are in paths.jsonl.
+	Use load_timeseries() and load_paths() to read them back.
+"""
+
+import json
+import os
+import socket
+import struct
+
+import numpy as np
+
+
+PORT_COLUMNS = [('time', 'f8'), ('dpid', 'u8'), ('port_no', 'u4'),
+				('speed', 'f4'),   # byte/s
+				('free_bw', 'f4')]   # Kbit/s, NaN if the port is down.
+FLOW_COLUMNS = [('time', 'f8'), ('dpid', 'u8'), ('priority', 'u2'),
+				('ipv4_src', 'u4'), ('ipv4_dst', 'u4'),
+				('speed', 'f4')]   # byte/s
+# Only the pairs whose chosen path changed are recorded.
+PATH_COLUMNS = [('time', 'f8'), ('src', 'u8'), ('dst', 'u8'),
+				('path_id', 'u4'),
+				('bandwidth', 'f4')]   # Kbit/s
+
+PATHS_FILE = 'paths.jsonl'
+
+
+def ip_to_int(ip):
+	return struct.unpack('!I', socket.inet_aton(ip))[0]
+
+
+def int_to_ip(value):
+	return socket.inet_ntoa(struct.pack('!I', int(value)))
+
+
+class ColumnTable(object):
+	"""
+		Append-only table of fixed-type columns, one memory-mapped file
+		per column. The files grow by doubling, so appending is a slice
+		assignment into the maps.
+	"""
+
+	def __init__(self, dirname, name, columns, chunk=4096):
+		self.dirname = dirname
+		self.name = name
+		self.columns = columns
+		self.rows = 0
+		self.capacity = 0
+		self.maps = {}
+		self._grow(chunk)
+		self.flush()
+
+	def _column_file(self, column):
+		return os.path.join(self.dirname, '%s.%s.bin' % (self.name, column))
+
+	def _grow(self, capacity):
+		for column, dtype in self.columns:
+			fname = self._column_file(column)
+			old = self.maps.pop(column, None)
+			if old is not None:
+				old.flush()
+				del old
+			mode = 'r+' if self.capacity else 'w+'
+			if mode == 'r+':
+				with open(fname, 'r+b') as f:
+					f.truncate(capacity * np.dtype(dtype).itemsize)
+			self.maps[column] = np.memmap(fname, dtype=dtype, mode=mode, shape=(capacity,))
+		self.capacity = capacity
+
+	def append(self, **values):
+		"""
+			Append rows, values = {column:sequence,} of equal length;
+			a scalar is repeated over all rows.
+		"""
+		n = max([len(v) for v in values.values() if not np.isscalar(v)] or [1])
+		if not n:
+			return
+		if self.rows + n > self.capacity:
+			capacity = self.capacity
+			while self.rows + n > capacity:
+				capacity *= 2
+			self._grow(capacity)
+		start, end = self.rows, self.rows + n
+		for column, dtype in self.columns:
+			self.maps[column][start:end] = values[column]
+		self.rows = end
+
+	def flush(self):
+		"""
+			Flush the maps and publish the number of rows written.
+		"""
+		for m in self.maps.values():
+			m.flush()
+		meta = {'columns': self.columns, 'rows': self.rows}
+		fname = os.path.join(self.dirname, '%s.json' % self.name)
+		with open(fname + '.tmp', 'w') as f:
+			json.dump(meta, f)
+		os.rename(fname + '.tmp', fname)
+
+
+class Recorder(object):
+	"""
+		Record port rates, flow rates, free bandwidth and chosen paths
+		into the directory dirname.
+	"""
+
+	def __init__(self, dirname):
+		if not os.path.isdir(dirname):
+			os.makedirs(dirname)
+		self.dirname = dirname
+		self.ports = ColumnTable(dirname, 'port', PORT_COLUMNS)
+		self.flows = ColumnTable(dirname, 'flow', FLOW_COLUMNS)
+		self.paths = ColumnTable(dirname, 'path', PATH_COLUMNS)
+		self.path_ids = {}   # {(dpid,):path_id,}
+		self.chosen = {}   # {(src, dst):path_id,}
+		self._ips = {}   # {ip:int,}
+		self._paths_file = open(os.path.join(dirname, PATHS_FILE), 'w')
+
+	def _ip(self, ip):
+		value = self._ips.get(ip)
+		if value is None:
+			value = self._ips[ip] = ip_to_int(ip)
+		return value
+
+	def record_ports(self, now, dpid, port_nos, speeds, free_bws):
+		self.ports.append(time=now, dpid=dpid, port_no=port_nos,
+						  speed=speeds, free_bw=free_bws)
+
+	def record_flows(self, now, dpid, keys, speeds):
+		"""
+			keys = [(priority, ipv4_src, ipv4_dst),]
+		"""
+		if not keys:
+			return
+		self.flows.append(time=now, dpid=dpid,
+						  priority=[key[0] for key in keys],
+						  ipv4_src=[self._ip(key[1]) for key in keys],
+						  ipv4_dst=[self._ip(key[2]) for key in keys],
+						  speed=speeds)
+
+	def record_paths(self, now, best_paths, capabilities):
+		"""
+			Record the pairs whose chosen path has changed.
+			best_paths = {src:{dst:[path],},}
+			capabilities = {src:{dst:bandwidth,},}
+		"""
+		srcs, dsts, ids, bws = [], [], [], []
+		for src, paths in best_paths.items():
+			for dst, path in paths.items():
+				path_id = self._get_path_id(path)
+				if self.chosen.get((src, dst)) != path_id:
+					self.chosen[(src, dst)] = path_id
+					srcs.append(src)
+					dsts.append(dst)
+					ids.append(path_id)
+					bws.append(capabilities[src][dst])
+		if srcs:
+			self.paths.append(time=now, src=srcs, dst=dsts,
+							  path_id=ids, bandwidth=bws)
+
+	def _get_path_id(self, path):
+		key = tuple(path)
+		path_id = self.path_ids.get(key)
+		if path_id is None:
+			path_id = self.path_ids[key] = len(self.path_ids)
+			self._paths_file.write(json.dumps([path_id, list(key)]) + '\n')
+		return path_id
+
+	def flush(self):
+		self._paths_file.flush()
+		for table in (self.ports, self.flows, self.paths):
+			table.flush()
+
+
+def load_timeseries(dirname, table):
+	"""
+		Load the table 'port', 'flow' or 'path' recorded in dirname.
+		Return {column:np.ndarray,}, the arrays are read-only memory maps.
+	"""
+	with open(os.path.join(dirname, '%s.json' % table)) as f:
+		meta = json.load(f)
+	rows = meta['rows']
+	data = {}
+	for column, dtype in meta['columns']:
+		fname = os.path.join(dirname, '%s.%s.bin' % (table, column))
+		if rows:
+			data[column] = np.memmap(fname, dtype=dtype, mode='r', shape=(rows,))
+		else:
+			data[column] = np.zeros(0, dtype=dtype)
+	return data
+
+
+def load_paths(dirname):
+	"""
+		Load the recorded paths, return {path_id:[dpid,],}.
+	"""
+	paths = {}
+	with open(os.path.join(dirname, PATHS_FILE)) as f:
+		for line in f:
+			if line.strip():
+				path_id, path = json.loads(line)
+				paths[path_id] = path
+	return paths
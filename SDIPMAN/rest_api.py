@@ -0,0 +1,163 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+	REST API of SDIPMAN, read-only JSON views of the controller state:
+
+	GET /sdipman/topology/links         link_to_port
+	GET /sdipman/topology/hosts         access_table
+	GET /sdipman/paths/shortest         shortest_paths
+	GET /sdipman/paths/best             best_paths and their bandwidth
+	GET /sdipman/stats/free_bandwidth   free_bandwidth
+	GET /sdipman/stats/flow_speed       flow speeds
+	GET /sdipman/stats/flow_install     latency of the flow entries confirmed by barriers,
+	                                    and duplicate packet_in of flows being set up
+	GET /sdipman/stats/poll_rates       stats polling rate of every datapath
+"""
+
+import json
+import time
+
+from ryu.app.wsgi import ControllerBase
+from ryu.app.wsgi import route
+from webob import Response
+
+
+APP_INSTANCE_NAME = 'sdipman_app'
+URL_BASE = '/sdipman'
+
+
+class SnapshotCache(object):
+	"""
+		Serialized JSON bodies, rebuilt only when their source changes.
+		A source that is replaced on every change (copy-on-write snapshots
+		such as shortest_paths and best_paths) is rebuilt as soon as it is
+		replaced; a source that is modified in place is rebuilt at most
+		once every `ttl` seconds.
+	"""
+
+	def __init__(self, ttl):
+		self.ttl = ttl
+		self.entries = {}   # {name:(source, expiry, body),}
+
+	def get(self, name, source, build, in_place=False):
+		now = time.time()
+		entry = self.entries.get(name)
+		if entry is not None and entry[0] is source:
+			if not in_place or now < entry[1]:
+				return entry[2]
+		body = json.dumps(build(source))
+		self.entries[name] = (source, now + self.ttl, body)
+		return body
+
+
+def _links(link_to_port):
+	return [{'src': src, 'dst': dst, 'src_port': src_port, 'dst_port': dst_port}
+			for (src, dst), (src_port, dst_port) in sorted(link_to_port.items())]
+
+
+def _hosts(access_table):
+	return [{'dpid': dpid, 'port': port, 'ip': ip, 'mac': mac}
+			for (dpid, port), (ip, mac) in sorted(access_table.items())]
+
+
+def _as_dict(table):
+	return table or {}
+
+
+def _as_paths_dict(paths):
+	return paths.to_dict() if paths else {}
+
+
+def _flow_speed(flow_speed):
+	flows = []
+	for dpid, speeds in sorted(flow_speed.items()):
+		for (priority, ipv4_src, ipv4_dst), speed in sorted(speeds.items()):
+			if len(speed):
+				flows.append({'dpid': dpid, 'priority': priority,
+							  'ipv4_src': ipv4_src, 'ipv4_dst': ipv4_dst,
+							  'speed': abs(speed[-1]) * 8 / 1000.0})   # Kbit/s
+	return flows
+
+
+class SDIPMANRestController(ControllerBase):
+	"""
+		Serve the controller state from cached snapshots, so that polling
+		the API does not serialize the same tables again and again.
+	"""
+
+	def __init__(self, req, link, data, **config):
+		super(SDIPMANRestController, self).__init__(req, link, data, **config)
+		self.app = data[APP_INSTANCE_NAME]
+
+	def _response(self, body):
+		return Response(content_type='application/json', body=body)
+
+	@route('sdipman', URL_BASE + '/topology/links', methods=['GET'])
+	def get_links(self, req, **kwargs):
+		awareness = self.app.awareness
+		return self._response(self.app.snapshots.get(
+			'links', awareness.link_to_port, _links, in_place=True))
+
+	@route('sdipman', URL_BASE + '/topology/hosts', methods=['GET'])
+	def get_hosts(self, req, **kwargs):
+		awareness = self.app.awareness
+		return self._response(self.app.snapshots.get(
+			'hosts', awareness.access_table, _hosts, in_place=True))
+
+	@route('sdipman', URL_BASE + '/paths/shortest', methods=['GET'])
+	def get_shortest_paths(self, req, **kwargs):
+		return self._response(self.app.snapshots.get(
+			'shortest_paths', self.app.awareness.shortest_paths, _as_paths_dict))
+
+	@route('sdipman', URL_BASE + '/paths/best', methods=['GET'])
+	def get_best_paths(self, req, **kwargs):
+		monitor = self.app.monitor
+
+		# best_paths and capabilities are always replaced together.
+		def _best_paths(best_paths):
+			return {'best_paths': best_paths or {},
+					'capabilities': monitor.capabilities or {}}
+
+		return self._response(self.app.snapshots.get(
+			'best_paths', monitor.best_paths, _best_paths))
+
+	@route('sdipman', URL_BASE + '/stats/free_bandwidth', methods=['GET'])
+	def get_free_bandwidth(self, req, **kwargs):
+		return self._response(self.app.snapshots.get(
+			'free_bandwidth', self.app.monitor.free_bandwidth, _as_dict, in_place=True))
+
+	@route('sdipman', URL_BASE + '/stats/flow_speed', methods=['GET'])
+	def get_flow_speed(self, req, **kwargs):
+		return self._response(self.app.snapshots.get(
+			'flow_speed', self.app.monitor.flow_speed, _flow_speed, in_place=True))
+
+	@route('sdipman', URL_BASE + '/stats/flow_install', methods=['GET'])
+	def get_flow_install(self, req, **kwargs):
+		# A few counters, cheaper to serialize than to cache.
+		installer = self.app.flow_installer
+		count, mean, maximum = installer.get_latency_stats()
+		return self._response(json.dumps({'count': count,
+										  'mean_ms': mean * 1000,
+										  'max_ms': maximum * 1000,
+										  'timeouts': installer.timeouts,
+										  'suppressed': self.app.flow_registry.suppressed}))
+
+	@route('sdipman', URL_BASE + '/stats/poll_rates', methods=['GET'])
+	def get_poll_rates(self, req, **kwargs):
+		rates = self.app.monitor.get_poll_rates()
+		return self._response(json.dumps(dict((str(dpid), rate) for dpid, rate in rates.items())))
+
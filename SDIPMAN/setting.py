@@ -20,17 +20,69 @@
 	Common Setting of EFattree.
 """
 
+import os
+
 DISCOVERY_PERIOD = 10   # For discovering topology.
 
 MONITOR_PERIOD = 2   # For monitoring traffic
 
+POLL_MIN_INTERVAL = 0.5   # Shortest stats polling interval of a busy switch.
+POLL_MAX_INTERVAL = 8   # Longest stats polling interval of an idle switch.
+POLL_TICK = 0.1   # Resolution of the stats polling scheduler.
+POLL_HIGH_UTILIZATION = 0.8   # Port utilization above which a switch is polled faster.
+POLL_FAST_CHANGE = 0.1   # Change of port utilization between two polls above which a switch is polled faster.
+
+RATE_ESTIMATOR = 'ewma'   # Smoothing of port and flow speeds: 'ewma' or 'window' (mean of the last RATE_WINDOW rates).
+RATE_EWMA_ALPHA = 0.5   # Weight of the newest rate in 'ewma' mode, 1 means no smoothing.
+RATE_WINDOW = 3   # Number of rates averaged in 'window' mode.
+RATE_OUTLIER_FACTOR = 3.0   # A rate farther than this many times the smoothed rate is held back as an outlier.
+RATE_OUTLIER_HOLD = 1   # Number of consecutive outliers held back before they are taken as a real change.
+RATE_OUTLIER_FLOOR = 12500   # Changes smaller than this (byte/s) are never outliers.
+RATE_TREND_BETA = 0   # Smoothing of the rate trend for predicting free bandwidth one period ahead, 0 disables prediction.
+
 TOSHOW_topo = True	   # For showing network topology in terminal
 TOSHOW_stat = True	   # For showing statistics in terminal
 TOSHOW_flow_stat = True	   # For showing flow statistics in terminal
 TOSHOW_port_stat = False	   # For showing port statistics in terminal
+TOSHOW_INTERVAL = 10   # Shortest interval (seconds) between two prints of the same table.
+
+REST_SNAPSHOT_TTL = 1.0   # Seconds a REST response of an in-place modified table is served from cache.
 
 enable_Flow_Entry_L4Port = False   # For including L4 port in the installing flow entries or not.
 
-MAX_CAPACITY = 10000   # Max capacity of link
+FLOW_IDLE_TIMEOUT = 5   # Idle timeout of per-flow entries, also the lifetime of flows known to the controller.
+
+FLOW_INSTALL_MODE = 'barrier'   # 'barrier': release packet after barrier replies of all hops; 'direct': release it at once.
+FLOW_SETUP_TIMEOUT = 1.0   # Seconds to wait for barrier replies before releasing the packet anyway.
+
+ROUTING_MODE = 'flow'   # 'flow': per-(ipv4_src, ipv4_dst) entries on every hop; 'prefix': per-flow entries on the first hop, per-destination-prefix entries elsewhere; 'wcmp': per-destination-host entries pointing to weighted select groups over the k paths.
+PREFIX_LEN = 16   # Length of destination prefixes in 'prefix' routing mode, e.g. 10.1.0.0/16.
+PREFIX_PRIORITY = 20   # Priority of destination prefix entries, lower than per-flow entries.
+WCMP_PRIORITY = 20   # Priority of destination host entries in 'wcmp' routing mode.
+WCMP_WEIGHT_TOLERANCE = 5   # Select groups are modified only when a bucket weight (1-100) moves by more than this.
+
+ENABLE_PATH_HASHING = False   # Pin every new flow to one of the k paths by rendezvous hashing weighted by free bandwidth, in 'flow' routing mode with the 'bw' weight, instead of the best path. Applied at flow setup, before ENABLE_REBALANCE and ENABLE_REROUTE may move the flow.
+
+ENABLE_REROUTE = False   # Move elephant flows to wider paths in 'flow' routing mode, after the best path updates on which ENABLE_REBALANCE does not run.
+ELEPHANT_THRESHOLD = 500   # Rate (Kbit/s) from which a flow is an elephant.
+REROUTE_MIN_GAIN = 200   # Least gain of available bandwidth (Kbit/s) for moving an elephant.
+REROUTE_HOLDDOWN = 10   # Seconds before a moved flow may be moved again.
+
+ENABLE_REBALANCE = False   # Rebalance all flows across their k paths in 'flow' routing mode, on every REBALANCE_PERIODS-th best path update, in place of ENABLE_REROUTE.
+REBALANCE_PERIODS = 5   # Rebalance every this many monitor periods.
+REBALANCE_MIN_IMPROVEMENT = 0.05   # Least decrease of the maximum link utilization for applying a rebalance.
+REBALANCE_MAX_MOVES = 64   # Most flows moved by one rebalance.
+
+ENABLE_ARP_PROXY = True   # Answer ARP requests for known hosts in the controller instead of forwarding them.
+ARP_FLOOD_INTERVAL = 1.0   # Seconds between two floods of ARP requests for the same unknown host.
+
+MAX_CAPACITY = 10000   # Max capacity of link, for the ports whose capacity is unknown.
+
+CAPACITY_MANIFEST = os.environ.get('SDIPMAN_CAPACITY_MANIFEST')   # Port capacities written by the topology script.
+
+RECORD_DIR = os.environ.get('SDIPMAN_RECORD_DIR')   # Directory to record port/flow rates and chosen paths into, None disables recording.
+
+KSP_WORKERS = None   # Number of worker processes computing K shortest paths, None means the number of CPUs.
+KSP_POOL_MIN_PAIRS = 256   # Fewer (src, dst) pairs to recompute than this are computed in the controller process. The workers are started the first time this many are.
 
 get_topology_delay = 30
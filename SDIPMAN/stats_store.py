@@ -0,0 +1,77 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import numpy as np
+
+
+class RingBuffer(object):
+	"""
+		Fixed-size ring buffer of samples in a preallocated array.
+		Every sample is a row of `width` numbers; appending overwrites the
+		oldest row when the buffer is full, so nothing is allocated or
+		shifted per sample. Indexing works like a list of the samples,
+		oldest first: buf[-1] is the newest one. A buffer of width 1
+		returns numbers, a wider one returns rows (views of the buffer,
+		only valid until the next append).
+	"""
+	__slots__ = ('_data', '_head', '_len')
+
+	def __init__(self, capacity, width=1):
+		self._data = np.zeros((capacity, width), dtype=np.float64)
+		self._head = 0   # Row of the next sample.
+		self._len = 0
+
+	@property
+	def capacity(self):
+		return self._data.shape[0]
+
+	@property
+	def width(self):
+		return self._data.shape[1]
+
+	def append(self, value):
+		self._data[self._head] = value
+		self._head = (self._head + 1) % self._data.shape[0]
+		if self._len < self._data.shape[0]:
+			self._len += 1
+
+	def __len__(self):
+		return self._len
+
+	def _row(self, i):
+		if i < 0:
+			i += self._len
+		if not 0 <= i < self._len:
+			raise IndexError('ring buffer index out of range')
+		return (self._head - self._len + i) % self._data.shape[0]
+
+	def __getitem__(self, i):
+		row = self._data[self._row(i)]
+		if self._data.shape[1] == 1:
+			return row[0]
+		return row
+
+
+def save_sample(store, key, value, length=5):
+	"""
+		Append value to the ring buffer of key in store = {key:RingBuffer,}.
+	"""
+	buf = store.get(key)
+	if buf is None:
+		width = len(value) if isinstance(value, (tuple, list)) else 1
+		buf = store[key] = RingBuffer(length, width)
+	buf.append(value)
+	return buf
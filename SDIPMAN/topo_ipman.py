@@ -24,6 +24,7 @@ from mininet.link import Link, Intf, TCLink
 from mininet.topo import Topo
 
 import os
+import json
 import logging
 import argparse
 import time
@@ -204,6 +205,24 @@ def set_host_ip(net, topo):
 		server.setIP("10.%d.0.1" % i)
 		i += 1
 
+def write_capacity_manifest(topo, fname):
+	"""
+		Write the capacity of every switch port to fname, for the controller.
+		The dpid of a switch is the number in its name. Unit: Kbit/s.
+	"""
+	entries = []
+	for src, dst, info in topo.links(withInfo=True):
+		capacity = info.get('bw')
+		if capacity is None:
+			continue
+		for node, port, peer in ((src, info['port1'], dst), (dst, info['port2'], src)):
+			if topo.isSwitch(node):
+				entries.append({'dpid': int(node), 'port': port,
+								'peer': peer, 'capacity': capacity * 1000})
+	with open(fname, 'w') as f:
+		json.dump(entries, f, indent=1)
+	return fname
+
 def install_proactive(net, topo):
 	"""
 		Install direct flow entries for edge switches.
@@ -327,7 +346,10 @@ def run_experiment(density, port=6653, bw_gz=23.2, bw_cdn=26.1, bw_c2a=3.3, bw_a
 	install_proactive(net, topo)
 
 	# 2. Start the controller.
-	Controller_Ryu = Popen("ryu-manager --observe-links ./SDIPMAN/SDIPMAN.py --k_paths=%d --weight=bw" % args.kpaths, shell=True, preexec_fn=os.setsid)
+	manifest = write_capacity_manifest(topo, os.path.abspath('%s/capacity.json' % args.output_dir))
+	env = dict(os.environ, SDIPMAN_CAPACITY_MANIFEST=manifest,
+			   SDIPMAN_RECORD_DIR=os.path.abspath('%s/records' % args.output_dir))
+	Controller_Ryu = Popen("ryu-manager --observe-links ./SDIPMAN/SDIPMAN.py --k_paths=%d --weight=bw" % args.kpaths, shell=True, preexec_fn=os.setsid, env=env)
 
 	# Wait until the controller has discovered network topology.
 	time.sleep(60)
@@ -0,0 +1,98 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import networkx as nx
+
+
+class TopologyGraph(object):
+	"""
+		Switch graph maintained from switch and link events, one node or
+		edge at a time. Every switch has a self-loop of weight 0 and every
+		link an edge of weight 1, like the adjacency matrix used to have.
+		Readers get frozen snapshots, graph.graph['version'] tells them
+		apart; a snapshot is copied at most once per version.
+	"""
+
+	def __init__(self):
+		self.version = 0
+		self._graph = nx.DiGraph()
+		self._snapshot = None
+
+	def _changed(self):
+		self.version += 1
+		self._snapshot = None
+
+	# The methods below return True if the graph has changed.
+
+	def add_switch(self, dpid):
+		if dpid in self._graph:
+			return False
+		self._graph.add_edge(dpid, dpid, weight=0)
+		self._changed()
+		return True
+
+	def remove_switch(self, dpid):
+		if dpid not in self._graph:
+			return False
+		self._graph.remove_node(dpid)
+		self._changed()
+		return True
+
+	def add_link(self, src, dst):
+		"""
+			Add the link (src, dst), if both switches are known.
+		"""
+		if src not in self._graph or dst not in self._graph or self._graph.has_edge(src, dst):
+			return False
+		self._graph.add_edge(src, dst, weight=1)
+		self._changed()
+		return True
+
+	def remove_link(self, src, dst):
+		if src == dst or not self._graph.has_edge(src, dst):
+			return False
+		self._graph.remove_edge(src, dst)
+		self._changed()
+		return True
+
+	def sync(self, switches, links):
+		"""
+			Bring the graph in line with the full lists of switches and
+			links, in O(V + E). Return True if anything has changed.
+		"""
+		version = self.version
+		switches = set(switches)
+		for dpid in [dpid for dpid in self._graph if dpid not in switches]:
+			self.remove_switch(dpid)
+		for dpid in switches:
+			self.add_switch(dpid)
+		links = set(links)
+		for (src, dst) in [(src, dst) for src, dst in self._graph.edges() if src != dst]:
+			if (src, dst) not in links:
+				self.remove_link(src, dst)
+		for (src, dst) in links:
+			self.add_link(src, dst)
+		return self.version != version
+
+	def snapshot(self):
+		"""
+			Get a frozen copy of the current graph.
+		"""
+		if self._snapshot is None:
+			graph = self._graph.copy()
+			graph.graph['version'] = self.version
+			self._snapshot = nx.freeze(graph)
+		return self._snapshot
@@ -0,0 +1,122 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def get_next_hops(shortest_paths, dst_sw):
+	"""
+		Loop-free multipath DAG towards dst_sw from the k paths of all pairs.
+		A link of a candidate path is kept only if it leads strictly closer
+		to dst_sw (by hop), so no packet can loop.
+		shortest_paths = {src:{dst:[[path],],},}
+		Return {dpid:[next_dpid,],}, dst_sw itself is not in it.
+	"""
+	dist = {dst_sw: 0}
+	for src, paths in shortest_paths.items():
+		k_paths = paths.get(dst_sw)
+		if k_paths:
+			dist[src] = len(k_paths[0]) - 1
+	next_hops = {}
+	for src in dist:
+		if src == dst_sw:
+			continue
+		for path in shortest_paths[src][dst_sw]:
+			for i in xrange(len(path) - 1):
+				node, nxt = path[i], path[i+1]
+				if nxt in dist and node in dist and dist[nxt] < dist[node]:
+					next_hops.setdefault(node, set()).add(nxt)
+	return dict((node, sorted(hops)) for node, hops in next_hops.items())
+
+
+def get_weights(next_hops, dst_sw, link_bw, default_bw, max_weight=100):
+	"""
+		Bucket weights of every switch in the DAG next_hops.
+		The weight of next hop v at switch u follows the widest bandwidth
+		from u to dst_sw through v, i.e. min(free bandwidth of (u, v),
+		widest bandwidth from v); scaled to integers up to max_weight.
+		link_bw = {(src_dpid, dst_dpid):free bandwidth,}, the links not in
+		it have default_bw.
+		Return {dpid:[weight,],}, in the order of next_hops[dpid].
+	"""
+	width = {dst_sw: float('inf')}
+	pending = set(next_hops)
+	bucket_bw = {}
+	# Switches are settled once all their next hops are, walking away from dst_sw.
+	while pending:
+		ready = [node for node in pending if all(nxt in width for nxt in next_hops[node])]
+		if not ready:
+			break
+		for node in ready:
+			bws = [min(link_bw.get((node, nxt), default_bw), width[nxt]) for nxt in next_hops[node]]
+			bucket_bw[node] = bws
+			width[node] = max(bws)
+			pending.discard(node)
+
+	weights = {}
+	for node, bws in bucket_bw.items():
+		top = max(bws)
+		if top <= 0:
+			weights[node] = [1] * len(bws)
+		else:
+			weights[node] = [int(round(bw * max_weight / float(top))) if bw > 0 else 0 for bw in bws]
+	return weights
+
+
+class WcmpRoute(object):
+	"""
+		Weighted multipath routes towards one destination switch.
+		Every switch in the DAG has one select group, group_id, whose
+		buckets lead to its next hops with weights following the free
+		bandwidth; the entries of the hosts behind dst_sw point to it.
+		next_hops = {dpid:[next_dpid,],}
+		weights = {dpid:[weight,],}
+		hosts = set(ip,)
+	"""
+
+	def __init__(self, dst_sw, group_id):
+		self.dst_sw = dst_sw
+		self.group_id = group_id
+		self.paths = None   # The shortest_paths snapshot next_hops is built from.
+		self.next_hops = {}
+		self.weights = {}
+		self.hosts = set()
+
+	def update(self, shortest_paths, link_bw, default_bw, tolerance=0):
+		"""
+			Recompute the DAG (if the candidate paths have changed) and the
+			weights. A switch keeps its old weights unless one of them moves
+			by more than tolerance, so that noise does not rewrite groups.
+			Return (added, changed, removed): the switches new to the DAG,
+			the switches whose buckets have changed, and the switches that
+			have left the DAG.
+		"""
+		old_hops, old_weights = self.next_hops, self.weights
+		if shortest_paths is not self.paths:
+			self.paths = shortest_paths
+			self.next_hops = get_next_hops(shortest_paths, self.dst_sw)
+		self.weights = get_weights(self.next_hops, self.dst_sw, link_bw, default_bw)
+		added, changed = [], []
+		for node in self.next_hops:
+			if node not in old_hops:
+				added.append(node)
+			elif old_hops[node] != self.next_hops[node]:
+				changed.append(node)
+			elif node in self.weights and node in old_weights:
+				if max([abs(a - b) for a, b in zip(old_weights[node], self.weights[node])] or [0]) > tolerance:
+					changed.append(node)
+				else:
+					self.weights[node] = old_weights[node]
+		removed = [node for node in old_hops if node not in self.next_hops]
+		return added, changed, removed
@@ -0,0 +1,58 @@
+# Copyright (C) 2019 Huang MaChi at China Mobile Communication
+# Corporation, Zhanjiang, Guangdong, China.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import heapq
+
+
+def widest_paths_from(graph, src, max_capacity, attr='bandwidth'):
+	"""
+		Widest (maximum bottleneck bandwidth) paths from src to all nodes,
+		by Dijkstra's algorithm with (min, max) in place of (+, min),
+		O(E log V). Among paths of the same width, the one with the least
+		hops is taken. Links without `attr` do not limit the path, like
+		in BandwidthPathSelector; the width never exceeds max_capacity.
+		Return (widths, paths), widths = {dst:bandwidth,}, paths = {dst:[path],}.
+	"""
+	widths = {src: max_capacity}
+	hops = {src: 0}
+	prev = {src: None}
+	done = set()
+	heap = [(-max_capacity, 0, src)]
+	while heap:
+		width, hop, node = heapq.heappop(heap)
+		if node in done:
+			continue
+		done.add(node)
+		width = -width
+		for nbr, data in graph[node].items():
+			if nbr in done:
+				continue
+			nbr_width = min(width, data.get(attr, max_capacity))
+			if nbr not in widths or nbr_width > widths[nbr] or \
+					(nbr_width == widths[nbr] and hop + 1 < hops[nbr]):
+				widths[nbr] = nbr_width
+				hops[nbr] = hop + 1
+				prev[nbr] = node
+				heapq.heappush(heap, (-nbr_width, hop + 1, nbr))
+
+	paths = {}
+	for dst in widths:
+		path = [dst]
+		while prev[path[-1]] is not None:
+			path.append(prev[path[-1]])
+		path.reverse()
+		paths[dst] = path
+	return dict((dst, max(width, 0)) for dst, width in widths.items()), paths